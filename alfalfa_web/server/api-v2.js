@@ -343,16 +343,17 @@ router.post("/runs/:runId/start", (req, res, next) => {
       endDatetime: ["required", regex(timeValidator)],
       timescale: "strict|numeric|min:1",
       realtime: "strict|boolean",
-      externalClock: "strict|boolean"
+      externalClock: "strict|boolean",
+      batch: "strict|boolean"
     }
   );
   if (error) return res.status(400).json({ message: error });
 
-  const { timescale, realtime, externalClock } = body;
+  const { timescale, realtime, externalClock, batch } = body;
 
-  if (!(timescale || realtime || externalClock)) {
+  if (!(timescale || realtime || externalClock || batch)) {
     return res.status(400).json({
-      message: "At least one of timescale, realtime, or externalClock must be specified."
+      message: "At least one of timescale, realtime, externalClock, or batch must be specified."
     });
   }
 
@@ -362,6 +363,12 @@ router.post("/runs/:runId/start", (req, res, next) => {
     });
   }
 
+  if (batch && (realtime || externalClock)) {
+    return res.status(400).json({
+      message: "Batch cannot be enabled with realtime or externalClock."
+    });
+  }
+
   api
     .startRun(req.run, body)
     .then((data) => {
@@ -372,8 +379,26 @@ router.post("/runs/:runId/start", (req, res, next) => {
 });
 
 router.post("/runs/:runId/advance", (req, res, next) => {
+  const { body } = req;
+
+  const timeValidator = /^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$/;
+  const error = validate(
+    { ...body },
+    {
+      steps: "strict|integer|min:1",
+      time: regex(timeValidator)
+    }
+  );
+  if (error) return res.status(400).json({ message: error });
+
+  if (body?.steps !== undefined && body?.time !== undefined) {
+    return res.status(400).json({
+      message: "Only one of steps or time can be specified."
+    });
+  }
+
   api
-    .advanceRun(req.run)
+    .advanceRun(req.run, body)
     .then(() => {
       res.sendStatus(204);
     })
@@ -22,6 +22,8 @@ class AlfalfaAPI {
     this.pub.connect();
 
     this.redisJobQueue = process.env.JOB_QUEUE || "Alfalfa Job Queue";
+    // Milliseconds to wait for a run to advance each timestep
+    this.advanceTimeout = Number(process.env.ADVANCE_TIMEOUT) || 60000;
 
     const credentials = fromEnv();
     const region = process.env.REGION || "us-east-1";
@@ -74,12 +76,14 @@ class AlfalfaAPI {
   };
 
   getRunDownloadPath = async (run) => {
+    // Runs checked in before the archive key was stored are always gzipped
+    const key = run.archive_key || `run/${run.ref_id}.tar.gz`;
     const signedURL = await getSignedUrl(
       this.s3,
       new GetObjectCommand({
         Bucket: process.env.S3_BUCKET,
-        Key: `run/${run.ref_id}.tar.gz`,
-        ResponseContentDisposition: `attachment; filename="${run.ref_id}.tar.gz"`
+        Key: key,
+        ResponseContentDisposition: `attachment; filename="${key.split("/").pop()}"`
       }),
       {
         expiresIn: 86400
@@ -201,7 +205,7 @@ class AlfalfaAPI {
 
     if (status !== "READY") return { error: "Run is not in 'READY' state" };
 
-    const { startDatetime, endDatetime, timescale, realtime, externalClock } = data;
+    const { startDatetime, endDatetime, timescale, realtime, externalClock, batch } = data;
 
     const job = `alfalfa_worker.jobs.${sim_type === "MODELICA" ? "modelica" : "openstudio"}.step_run.StepRun`;
     const params = {
@@ -210,14 +214,30 @@ class AlfalfaAPI {
       end_datetime: endDatetime,
       timescale: `${timescale || 5}`,
       realtime: `${!!realtime}`,
-      external_clock: `${!!externalClock}`
+      external_clock: `${!!externalClock}`,
+      batch: `${!!batch}`
     };
 
     await this.sendJobToQueue(job, params);
   };
 
-  advanceRun = async (run) => {
-    return await this.sendRunMessage(run, "advance");
+  advanceRun = async (run, { steps, time } = {}) => {
+    if (time) {
+      const timeout = this.advanceTimeout * (await this.getStepsToTime(run, time));
+      return await this.sendRunMessage(run, "advance_to", { sim_time: time }, timeout);
+    }
+    return await this.sendRunMessage(run, "advance", steps ? { steps } : null, this.advanceTimeout * (steps || 1));
+  };
+
+  // Number of timesteps between the current time of a run and a later time, at least one
+  getStepsToTime = async (run, time) => {
+    const [simTime, timestepDuration] = await Promise.all([
+      this.getRunTime(run),
+      getHashValue(this.redis, run.ref_id, "timestep_duration")
+    ]);
+    const parseTime = (value) => DateTime.fromISO(`${value}`.replace(" ", "T"), { zone: "UTC" });
+    const steps = Math.ceil(parseTime(time).diff(parseTime(simTime)).as("seconds") / Number(timestepDuration));
+    return Number.isFinite(steps) && steps > 1 ? steps : 1;
   };
 
   stopRun = async (run) => {
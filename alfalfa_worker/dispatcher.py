@@ -1,13 +1,20 @@
 import json
 import os
+import socket
+import sys
 import traceback
 from importlib import import_module
+from logging import StreamHandler, basicConfig
+from multiprocessing import get_context
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
 from pathlib import Path
 from typing import Dict
 
 from alfalfa_worker.lib.alfalfa_connections_manager import (
     AlafalfaConnectionsManager
 )
+from alfalfa_worker.lib.constants import DATETIME_FORMAT
 # Currently this is a child of WorkerJobBase, but mostly for the
 # alfalfa connections. WorkerJobBase could/should be updated to inherit
 # from a new class that just handles the alfalfa connections, then
@@ -16,6 +23,12 @@ from alfalfa_worker.lib.job import Job, JobStatus
 from alfalfa_worker.lib.logger_mixins import DispatcherLoggerMixin
 from alfalfa_worker.lib.run_manager import RunManager
 
+# Seconds the published slot utilization of a dispatcher lives for unless it is refreshed,
+# so dispatchers which exit without cleaning up don't leave stale entries
+SLOTS_TTL = 60
+# Maximum seconds the pool loop blocks for, which bounds how often the slot utilization is refreshed
+POOL_POLL_INTERVAL = 10
+
 
 class Dispatcher(DispatcherLoggerMixin):
     """Class to pop data off a queue and determine to where the work needs
@@ -25,9 +38,13 @@ class Dispatcher(DispatcherLoggerMixin):
     This class is currently designed to do the work on the worker that it is
     attached to. That is, the Dispatcher is not designed to pop work off the
     queue and submit the job to another worker with the requisite files.
+
+    With a single slot jobs are run inline, one at a time. With more than one
+    slot each job is run in its own process and messages are only popped off
+    the queue while a slot is free.
     """
 
-    def __init__(self, workdir: Path):
+    def __init__(self, workdir: Path, slots: int = None):
         super().__init__()
         connections_manager = AlafalfaConnectionsManager()
         self.redis = connections_manager.redis
@@ -40,6 +57,19 @@ class Dispatcher(DispatcherLoggerMixin):
             self.workdir.mkdir()
         self.run_manager = RunManager(self.workdir)
 
+        # Number of jobs which can be run concurrently
+        self.slots = slots if slots is not None else self.slots_from_env()
+        self.job_processes: list[BaseProcess] = []
+        self.slots_key = f"dispatcher:{socket.gethostname()}:{os.getpid()}"
+
+    @staticmethod
+    def slots_from_env() -> int:
+        """Get the number of job slots from WORKER_SLOTS. 'auto' uses the number of CPUs"""
+        slots = os.environ.get('WORKER_SLOTS', '1')
+        if slots == 'auto':
+            return os.cpu_count()
+        return max(1, int(slots))
+
     def process_message(self, message):
         """Process a single message from Queue.
         message structure:
@@ -57,7 +87,10 @@ class Dispatcher(DispatcherLoggerMixin):
             job = message_body.get('job')
             if job:
                 params = message_body.get('params', {})
-                self.start_job(job, params)
+                if self.slots > 1:
+                    self.start_job_process(job, params)
+                else:
+                    self.start_job(job, params)
 
         except Exception as e:
             tb = traceback.format_exc()
@@ -66,6 +99,8 @@ class Dispatcher(DispatcherLoggerMixin):
     def run(self):
         """Listen to queue and process messages upon arrival
         """
+        if self.slots > 1:
+            return self.run_pool()
         self.logger.info("Entering dispatcher run")
         while True:
             # BRPOP Blocks until there is a message in the queue
@@ -80,6 +115,77 @@ class Dispatcher(DispatcherLoggerMixin):
                 tb = traceback.format_exc()
                 self.logger.info("Exception caught in dispatcher.run: {} with {}".format(e, tb))
 
+    def run_pool(self):
+        """Listen to queue and start a process for each message while there are free slots"""
+        self.logger.info(f"Entering dispatcher run with {self.slots} job slots")
+        self.report_slots()
+        try:
+            while True:
+                try:
+                    self.run_pool_once()
+                except Exception as e:
+                    tb = traceback.format_exc()
+                    self.logger.info("Exception caught in dispatcher.run_pool: {} with {}".format(e, tb))
+        finally:
+            self.redis.delete(self.slots_key)
+
+    def run_pool_once(self) -> None:
+        """Wait for a free slot or a message and process it.
+        Blocks for at most POOL_POLL_INTERVAL seconds."""
+        self.publish_slots()
+        if self.reap_job_processes() >= self.slots:
+            # Block until a job process exits
+            wait([process.sentinel for process in self.job_processes], timeout=POOL_POLL_INTERVAL)
+            return
+        # BRPOP Blocks until there is a message in the queue
+        # The timeout allows finished processes to be reaped while idle
+        response = self.redis.brpop(self.job_queue, timeout=POOL_POLL_INTERVAL)
+        if response is None:
+            return
+        [key, message] = response
+        message = message.decode()
+        self.logger.info('Message Received with payload: %s' % message)
+        # Process Message
+        self.process_message(message)
+
+    def start_job_process(self, job_name, parameters) -> BaseProcess:
+        """Start job in a new process.
+        Processes are spawned so the job creates its own database connections."""
+        process = get_context('spawn').Process(target=_run_job_process,
+                                               args=(self.workdir, job_name, parameters),
+                                               name=job_name)
+        process.start()
+        self.job_processes.append(process)
+        self.report_slots()
+        return process
+
+    def reap_job_processes(self) -> int:
+        """Remove job processes which have exited.
+
+        Returns:
+            int: Number of busy slots.
+        """
+        busy = [process for process in self.job_processes if process.is_alive()]
+        for process in self.job_processes:
+            if process not in busy:
+                process.join()
+                self.logger.info(f"Job process {process.name} exited with code {process.exitcode}")
+                process.close()
+        if len(busy) != len(self.job_processes):
+            self.job_processes = busy
+            self.report_slots()
+        return len(self.job_processes)
+
+    def report_slots(self) -> None:
+        """Log and publish slot utilization"""
+        self.logger.info(f"Job slots in use: {len(self.job_processes)}/{self.slots}")
+        self.publish_slots()
+
+    def publish_slots(self) -> None:
+        """Publish slot utilization to redis, where it expires unless it is published again within SLOTS_TTL"""
+        self.redis.hset(self.slots_key, mapping={'slots': self.slots, 'busy_slots': len(self.job_processes)})
+        self.redis.expire(self.slots_key, SLOTS_TTL)
+
     def start_job(self, job_name, parameters) -> JobStatus:
         """Start job by Python class path"""
         # Now that we aren't running as subprocesses we need this
@@ -118,3 +224,20 @@ class Dispatcher(DispatcherLoggerMixin):
     @staticmethod
     def get_jobs():
         return Job.jobs.copy()
+
+
+def configure_logging() -> None:
+    """Configure the root logger for the dispatcher and job processes"""
+    basicConfig(level=os.environ.get("LOGLEVEL", "INFO"),
+                handlers=[StreamHandler(sys.stdout)],
+                format='%(asctime)s - %(name)s - %(levelname)s: %(message)s',
+                datefmt=DATETIME_FORMAT)
+
+
+def _run_job_process(workdir: Path, job_name: str, parameters: Dict) -> None:
+    """Entrypoint of job processes started by a Dispatcher with multiple slots"""
+    configure_logging()
+    dispatcher = Dispatcher(workdir, slots=1)
+    dispatcher.start_job(job_name, parameters)
+    # Don't exit until runs which were checked in asynchronously are in s3
+    dispatcher.run_manager.wait_for_uploads()
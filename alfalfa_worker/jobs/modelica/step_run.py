@@ -3,14 +3,16 @@ from datetime import datetime, timedelta
 from alfalfa_worker.jobs.step_run_base import StepRunBase
 from alfalfa_worker.lib.enums import PointType
 from alfalfa_worker.lib.job import message
+from alfalfa_worker.lib.job_exception import JobExceptionMessageHandler
 from alfalfa_worker.lib.models import Point
 from alfalfa_worker.lib.testcase import TestCase
+from alfalfa_worker.lib.utils import arrays_to_lists
 
 
 class StepRun(StepRunBase):
-    def __init__(self, run_id, realtime, timescale, external_clock, start_datetime: datetime, end_datetime) -> None:
+    def __init__(self, run_id, realtime, timescale, external_clock, start_datetime: datetime, end_datetime, batch=False) -> None:
         self.checkout_run(run_id)
-        super().__init__(run_id, realtime, timescale, external_clock, start_datetime, end_datetime)
+        super().__init__(run_id, realtime, timescale, external_clock, start_datetime, end_datetime, batch)
 
         self.logger.info(f"current datetime at start of simulation: {self.options.start_datetime}")
 
@@ -77,13 +79,63 @@ class StepRun(StepRunBase):
         self.run.save()
 
     @message
-    def advance(self):
-        self.logger.info("advance called")
+    def get_forecast(self, horizon: float = 24 * 3600, interval: float = None, category: str = None) -> dict:
+        """Get a forecast of the test case data from the current simulation time.
+
+        Args:
+            horizon (float): Length of the forecast in seconds. Defaults to one day.
+            interval (float): Seconds between forecast values. Defaults to the simulation timestep.
+            category (str): Category of test case data to forecast, such as weather or prices. Defaults to all data.
+
+        Returns:
+            dict: Time in seconds from the beginning of the year and the forecast of each variable.
+        """
+        data_manager = self.tc.data_manager
+        if category is not None and category not in data_manager.categories:
+            raise JobExceptionMessageHandler(f"Unknown forecast category '{category}'. Expected one of {list(data_manager.categories)}")
+        try:
+            data = data_manager.get_data(horizon=horizon, interval=interval, category=category)
+        except ValueError as e:
+            raise JobExceptionMessageHandler(f"Unable to get forecast: {e}") from e
+        return arrays_to_lists(data)
+
+    @message
+    def get_kpis(self) -> dict:
+        """Get the KPIs of the test case from the start of the simulation"""
+        return self.tc.get_kpis()
+
+    @message
+    def advance(self, steps: int = 1):
+        steps = self.check_advance_steps(steps)
+        self.logger.info(f"advance of {steps} steps called")
+        # Inputs are read at the start of the advance and outputs are published at the end of it
+        for step in range(steps):
+            self.step(read_inputs=step == 0, publish=step == steps - 1)
+
+    def fast_forward(self, steps: int) -> None:
+        """Advance the FMU to the start time in a single step without inputs"""
+        step = self.tc.get_step()
+        self.tc.set_step(step * steps)
+        try:
+            self.step(read_inputs=False, publish=True)
+        finally:
+            self.tc.set_step(step)
+
+    def step(self, read_inputs: bool = True, publish: bool = True):
+        """Advance the FMU one timestep
+
+        Args:
+            read_inputs (bool): Read the values of the input points. Otherwise the FMU keeps its previous inputs.
+            publish (bool): Publish the values of the output points as well as writing them to the historian.
+        """
         # u represents simulation input values
         u = {}
 
-        for point in self.run.input_points:
-            value = point.value
+        input_points = []
+        if read_inputs:
+            self.point_io.begin_step()
+            input_points = self.run.input_points
+        for point, value in zip(input_points, self.point_io.read_inputs(input_points)):
             activate = "activate" in self.variables[point.ref_id]
             if value is not None:
                 u[point.name] = value
@@ -98,9 +150,10 @@ class StepRun(StepRunBase):
 
         # get each of the simulation output values and feed to the database
         influx_points = []
+        output_values = []
         for point in self.run.output_points:
             value = y_output[point.name]
-            point.value = y_output
+            output_values.append((point, value))
 
             if self.options.historian_enabled:
                 influx_points.append({"fields":
@@ -113,19 +166,10 @@ class StepRun(StepRunBase):
                                           "source": "alfalfa"
                                       },
                                       "measurement": self.run.ref_id,
-                                      "time": self.run.sim_time,
+                                      "time": self.sim_time,
                                       })
+        if publish:
+            self.point_io.write_outputs(output_values)
 
-        if self.historian_enabled:
-            try:
-                response = self.influx_client.write_points(points=influx_points,
-                                                           time_precision='s',
-                                                           database=self.influx_db_name)
-            except ConnectionError as e:
-                self.logger.error(f"Influx ConnectionError on curVal write: {e}")
-            if not response:
-                self.logger.warning(f"Unsuccessful write to influx.  Response: {response}")
-                self.logger.info(f"Attempted to write: {influx_points}")
-            else:
-                self.logger.info(
-                    f"Successful write to influx.  Length of JSON: {len(influx_points)}")
+        if self.historian:
+            self.historian.write_points(influx_points)
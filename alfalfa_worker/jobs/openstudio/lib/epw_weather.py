@@ -0,0 +1,77 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Seconds in a year without a leap day, which is how EnergyPlus treats weather files
+YEAR_SECONDS = 365 * 24 * 3600
+# Year without a leap day used to convert dates of the weather file to seconds
+NON_LEAP_YEAR = 2009
+
+
+def seconds_of_year(time: datetime) -> float:
+    """Get the seconds from the beginning of the year to a time, skipping the leap day like the weather data does.
+    February 29 is treated as February 28."""
+    day = min(time.day, 28) if time.month == 2 else time.day
+    return (time.replace(year=NON_LEAP_YEAR, day=day) - datetime(NON_LEAP_YEAR, 1, 1)).total_seconds()
+
+
+class EPWWeather:
+    """Weather data from an EPW file, held in memory to serve forecasts of a running simulation.
+
+    Values are converted to the names and SI units of the BOPTEST weather category so that
+    forecasts of OpenStudio and Modelica runs can be used the same way."""
+
+    # Weather variable: (EPW column, value the EPW format uses for missing data, conversion from EPW units)
+    COLUMNS = {
+        'TDryBul': (6, 99.9, lambda x: x + 273.15),
+        'TDewPoi': (7, 99.9, lambda x: x + 273.15),
+        'relHum': (8, 999, lambda x: x / 100),
+        'pAtm': (9, 999999, lambda x: x),
+        'HHorIR': (12, 9999, lambda x: x),
+        'HGloHor': (13, 9999, lambda x: x),
+        'HDirNor': (14, 9999, lambda x: x),
+        'HDifHor': (15, 9999, lambda x: x),
+        'winDir': (20, 999, np.deg2rad),
+        'winSpe': (21, 999, lambda x: x),
+        'nTot': (22, 99, lambda x: x / 10),
+        'nOpa': (23, 99, lambda x: x / 10),
+        'celHei': (25, 99999, lambda x: x),
+    }
+
+    def __init__(self, epw_path: os.PathLike) -> None:
+        epw = pd.read_csv(epw_path, skiprows=8, header=None)
+        # EnergyPlus skips leap days unless the run period asks for them
+        epw = epw[~((epw[1] == 2) & (epw[2] == 29))]
+        day_of_year = pd.to_datetime(pd.DataFrame({'year': NON_LEAP_YEAR, 'month': epw[1], 'day': epw[2]})).dt.dayofyear - 1
+        # Values are for the end of the interval. Hourly files have a minute of 0.
+        minute = epw[4].where(epw[4] > 0, 60)
+        time = (day_of_year * 86400 + (epw[3] - 1) * 3600 + minute * 60).to_numpy(dtype=float)
+
+        # Time and value of the records of each variable which are not missing, so missing records are interpolated over
+        self.data: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for key, (column, missing, converter) in self.COLUMNS.items():
+            values = epw[column].to_numpy(dtype=float)
+            valid = values < missing
+            self.data[key] = (time[valid], converter(values[valid]))
+
+    def get_data(self, start: float, horizon: float, interval: float) -> dict[str, np.ndarray]:
+        """Get weather data linearly interpolated over a horizon, wrapping around the end of the year.
+
+        Args:
+            start (float): Start of the horizon in seconds from the beginning of the year.
+            horizon (float): Length of the horizon in seconds.
+            interval (float): Seconds between values.
+
+        Returns:
+            dict[str, np.ndarray]: Time in seconds from the beginning of the year and the value of each variable.
+        """
+        index = np.arange(start, start + horizon, interval)
+        data = {'time': index}
+        for key, (time, values) in self.data.items():
+            if len(values) == 0:
+                data[key] = np.full(len(index), np.nan)
+            else:
+                data[key] = np.interp(index, time, values, period=YEAR_SECONDS)
+        return data
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import List
 
 from alfalfa_worker.jobs.openstudio.lib.openstudio_component import (
     OpenStudioComponent
@@ -53,6 +54,27 @@ class OpenStudioPoint:
         else:
             run.add_point(self.point)
 
+    @staticmethod
+    def attach_points(points: List["OpenStudioPoint"], run: Run):
+        """Attach many points to a run at once.
+        Conflicting ids are renamed the same way as attach_run, but they are resolved in memory
+        against a single query of the points already in the run and new points are inserted in bulk."""
+        existing_ids = set(Point.objects(run=run).scalar('ref_id'))
+        new_points = []
+        for point in points:
+            if point.point is None:
+                point.create_point()
+            if point.point.pk is not None:
+                # Points which have already been saved may match their existing document
+                point.attach_run(run)
+                existing_ids.add(point.point.ref_id)
+                continue
+            while point.point.ref_id in existing_ids:
+                point.point.ref_id = point.point.ref_id + "_1"
+            existing_ids.add(point.point.ref_id)
+            new_points.append(point.point)
+        run.add_points(new_points)
+
     def pre_initialize(self, api, state):
         if self.input:
             self.input.pre_initialize(api, state)
@@ -80,12 +102,20 @@ class OpenStudioPoint:
 
     def update_input(self, api, state):
         if self.input:
-            self.input.write_value(api, state, self.point.value)
+            self.write_input(api, state, self.point.value)
+
+    def write_input(self, api, state, value):
+        if self.input:
+            self.input.write_value(api, state, value)
 
     def update_output(self, api, state) -> float:
-        if self.output:
-            value = self.output.read_value(api, state)
-            if self.point:
-                self.point.value = value
-                return value
+        if self.output and self.point:
+            value = self.read_output(api, state)
+            self.point.value = value
+            return value
+        return None
+
+    def read_output(self, api, state) -> float:
+        if self.output and self.point:
+            return self.output.read_value(api, state)
         return None
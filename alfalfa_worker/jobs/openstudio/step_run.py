@@ -2,20 +2,30 @@ import json
 import math
 import os
 from datetime import datetime, timedelta
+from time import monotonic
 from typing import Callable
 
 import openstudio
 from pyenergyplus.api import EnergyPlusAPI
 
+from alfalfa_worker.jobs.openstudio.lib.epw_weather import (
+    EPWWeather,
+    seconds_of_year
+)
 from alfalfa_worker.jobs.openstudio.lib.openstudio_component import (
     OpenStudioComponent
 )
 from alfalfa_worker.jobs.openstudio.lib.openstudio_point import OpenStudioPoint
 from alfalfa_worker.jobs.step_run_process import StepRunProcess
+from alfalfa_worker.lib.job import message
 from alfalfa_worker.lib.job_exception import (
     JobException,
-    JobExceptionExternalProcess
+    JobExceptionExternalProcess,
+    JobExceptionMessageHandler
 )
+from alfalfa_worker.lib.kpi_accumulator import KPIAccumulator
+from alfalfa_worker.lib.log_tailer import LogTailer
+from alfalfa_worker.lib.utils import arrays_to_lists
 
 
 def callback_wrapper(func):
@@ -29,9 +39,12 @@ def callback_wrapper(func):
 
 class StepRun(StepRunProcess):
 
-    def __init__(self, run_id, realtime, timescale, external_clock, start_datetime, end_datetime) -> None:
+    def __init__(self, run_id, realtime, timescale, external_clock, start_datetime, end_datetime, batch=False) -> None:
+        start_time = monotonic()
         self.checkout_run(run_id)
-        super().__init__(run_id, realtime, timescale, external_clock, start_datetime, end_datetime)
+        # Wall time in seconds of each phase of start-up
+        self.startup_times = {'checkout': monotonic() - start_time}
+        super().__init__(run_id, realtime, timescale, external_clock, start_datetime, end_datetime, batch)
         self.options.timestep_duration = timedelta(minutes=1)
 
         # If idf_file is named "in.idf" we need to change the name because in.idf is not accepted by mlep
@@ -44,25 +57,38 @@ class StepRun(StepRunProcess):
         dst_idf_file.rename(self.idf_file)
 
         self.weather_file = os.path.realpath(self.dir / 'simulation' / 'sim.epw')
+        self.weather = EPWWeather(self.weather_file)
 
         self.logger.info('Generating variables from Openstudio output')
         self.ep_points: list[OpenStudioPoint] = []
         for alfalfa_json in self.run.dir.glob('**/run/alfalfa.json'):
             self.ep_points += [OpenStudioPoint(**point) for point in json.load(alfalfa_json.open())]
 
+        # Whole building meters, which are also used to calculate KPIs
+        self.kpi_meters: dict[str, OpenStudioComponent] = {}
+
         def add_additional_meter(fuel: str, units: str, converter: Callable[[float], float]):
             meter_component = OpenStudioComponent("Meter", {"meter_name": f"{fuel}:Building"}, converter)
             meter_point = OpenStudioPoint(id=f"whole_building_{fuel.lower()}", name=f"Whole Building {fuel}", units=units)
             meter_point.output = meter_component
             self.ep_points.append(meter_point)
+            self.kpi_meters[fuel] = meter_component
 
         add_additional_meter("Electricity", "W", lambda x: x / self.options.timesteps_per_hour)
         add_additional_meter("NaturalGas", "W", lambda x: x / self.options.timesteps_per_hour)
 
-        [point.attach_run(self.run) for point in self.ep_points]
+        points_start_time = monotonic()
+        OpenStudioPoint.attach_points(self.ep_points, self.run)
+        self.startup_times['attach_points'] = monotonic() - points_start_time
+        self.logger.info(f"Attached {len(self.ep_points)} points in {self.startup_times['attach_points']:.3f} s")
+
+        # Energy of each meter in J, updated by the simulation process
+        self.kpis = KPIAccumulator(self.kpi_meters.keys())
 
         self.ep_api: EnergyPlusAPI = None
         self.ep_state = None
+        self.error_logs = LogTailer(self.dir, '**/*.err')
+        self.startup_times['total'] = monotonic() - start_time
 
     def simulation_process_entrypoint(self):
         """
@@ -87,9 +113,28 @@ class StepRun(StepRunProcess):
         return_code = self.ep_api.runtime.run_energyplus(state=self.ep_state, command_line_args=['-w', str(self.weather_file), '-d', str(self.dir / 'simulation'), '-r', str(self.idf_file)])
         self.logger.info(f"Exited simulation with code: {return_code}")
         if return_code != 0:
-            self.check_for_errors()
+            self.check_for_errors(exited=True)
             raise JobExceptionExternalProcess(f"EnergyPlus Exited with a non-zero exit code: {return_code}")
 
+    @message
+    def get_forecast(self, horizon: float = 24 * 3600, interval: float = None, category: str = 'weather') -> dict:
+        """Get a forecast of the weather file from the current simulation time.
+
+        Args:
+            horizon (float): Length of the forecast in seconds. Defaults to one day.
+            interval (float): Seconds between forecast values. Defaults to the simulation timestep.
+            category (str): Category of data to forecast. Only weather is available for OpenStudio runs.
+
+        Returns:
+            dict: Time in seconds from the beginning of the year and the forecast of each weather variable.
+        """
+        if category not in (None, 'weather'):
+            raise JobExceptionMessageHandler(f"Forecast category '{category}' is not available for OpenStudio runs")
+        if interval is None:
+            interval = self.options.timestep_duration.total_seconds()
+        start = seconds_of_year(self.sim_time)
+        return arrays_to_lists(self.weather.get_data(start, horizon, interval))
+
     def callback_message(self, message: bytes) -> None:
         """Callback for when energyplus records a messaage to the log"""
         try:
@@ -135,35 +180,44 @@ class StepRun(StepRunProcess):
 
             # If execution makes it here it means the simulation has left warmup and needs to be readied for regular running
             self.update_run_time()
-            self.running_event.set()
-
-        # Update outputs from simulation
-        self.ep_read_outputs()
+            self.set_running()
+
+        # Update outputs from simulation. Timesteps before the start time are not recorded.
+        publish = self.publish_step()
+        if publish:
+            self.point_io.begin_step()
+        if publish or (self.historian and not self.fast_forwarding):
+            self.ep_read_outputs(publish)
+        self.update_kpis()
         self.update_run_time()
 
-        # Wait for event from main process
-        self.advance_event.clear()
-        while not self.advance_event.is_set() and not self.stop_event.is_set():
-            self.advance_event.wait(1)
-
-        # Handle stop event
-        if self.stop_event.is_set():
+        # Wait for the main process to advance the simulation, or stop it
+        if not self.wait_for_advance():
             self.logger.info("Stop Event Set, stopping simulation")
             self.ep_api.runtime.stop_simulation(state)
 
-        # Write inputs to energyplus
-        self.ep_write_inputs()
+        # Write inputs to energyplus at the start of each advance, unless fast forwarding to the start time
+        if not self.continuing_advance and not self.fast_forwarding:
+            self.ep_write_inputs()
 
     def get_sim_time(self) -> datetime:
         sim_time = self.options.start_datetime.replace(hour=0, minute=0) + timedelta(hours=self.ep_api.exchange.current_sim_time(self.ep_state))
         sim_time -= timedelta(minutes=1)  # Energyplus gives time at the end of current timestep, we want the beginning
         return sim_time
 
-    def ep_read_outputs(self):
-        """Reads outputs from E+ state"""
+    def ep_read_outputs(self, publish: bool = True):
+        """Reads outputs from E+ state
+
+        Args:
+            publish (bool): Publish the values of the output points as well as writing them to the historian.
+        """
         influx_points = []
+        output_values = []
         for point in self.ep_points:
-            value = point.update_output(self.ep_api, self.ep_state)
+            if point.output is None or point.point is None:
+                continue
+            value = point.read_output(self.ep_api, self.ep_state)
+            output_values.append((point.point, value))
             if self.options.historian_enabled and value is not None and not math.isnan(value):
                 influx_points.append({"fields":
                                       {
@@ -177,26 +231,42 @@ class StepRun(StepRunProcess):
                                           "source": "alfalfa"
                                       },
                                       "measurement": self.run.ref_id,
-                                      "time": self.run.sim_time,
+                                      "time": self.sim_time,
                                       })
-        if self.historian_enabled:
-            try:
-                response = self.influx_client.write_points(points=influx_points,
-                                                           time_precision='s',
-                                                           database=self.influx_db_name)
-            except ConnectionError as e:
-                self.logger.error(f"Influx ConnectionError on curVal write: {e}")
-            if not response:
-                self.logger.warning(f"Unsuccessful write to influx.  Response: {response}")
-                self.logger.info(f"Attempted to write: {influx_points}")
-            else:
-                self.logger.info(
-                    f"Successful write to influx.  Length of JSON: {len(influx_points)}")
+        if publish:
+            self.point_io.write_outputs(output_values)
+        if self.historian:
+            self.historian.write_points(influx_points)
+
+    def update_kpis(self):
+        """Add the energy used during the last timestep to the KPIs.
+        Timesteps before the start time are skipped, so the KPIs accumulate from the start of the run."""
+        if self.fast_forwarding:
+            return
+        energy = {}
+        for fuel, meter in self.kpi_meters.items():
+            if meter.handle is not None and meter.handle != -1:
+                energy[fuel] = self.ep_api.exchange.get_meter_value(self.ep_state, meter.handle)
+        self.kpis.add(energy)
+
+    @message
+    def get_kpis(self) -> dict:
+        """Get the energy used by the building from the start of the simulation in kWh"""
+        kpis = {fuel.lower(): self.kpis.integral(fuel) * 2.77778e-7 for fuel in self.kpi_meters.keys()}
+        kpis['energy'] = sum(kpis.values())
+        return kpis
+
+    def collect_metrics(self) -> dict:
+        metrics = super().collect_metrics()
+        metrics.update({f'startup_{phase}_time': duration for phase, duration in self.startup_times.items()})
+        return metrics
 
     def ep_write_inputs(self):
         """Writes inputs to E+ state"""
-        for point in self.ep_points:
-            point.update_input(self.ep_api, self.ep_state)
+        input_points = [point for point in self.ep_points if point.input is not None]
+        values = self.point_io.read_inputs(point.point for point in input_points)
+        for point, value in zip(input_points, values):
+            point.write_input(self.ep_api, self.ep_state, value)
 
     def prepare_idf(self):
         """
@@ -259,19 +329,16 @@ class StepRun(StepRunProcess):
             self.ep_api.runtime.stop_simulation(self.ep_state)
 
     def read_error_logs(self) -> list[str]:
-        error_logs = []
-        for error_file in self.dir.glob('**/*.err'):
-            error_log = f"{error_file}:\n"
-            error_log += error_file.read_text()
-            error_logs.append(error_log)
-        return error_logs
-
-    def check_for_errors(self):
-        error_logs = self.read_error_logs()
-        exception = JobExceptionExternalProcess("Energy plus terminated with error")
-        for error_log in error_logs:
-            exception.add_note(error_log)
-
-        if "EnergyPlus Terminated" in '\n'.join(error_logs):
+        self.error_logs.update(discover=True)
+        return [f"{error_file}:\n{error_log}" for error_file, error_log in self.error_logs.logs().items()]
+
+    def check_for_errors(self, exited: bool = False):
+        # Only read what was appended to the error logs since the last check, as this is called on every advance.
+        # Once EnergyPlus has exited, search for error logs which were created since the last discovery too.
+        self.error_logs.update(discover=exited)
+        if self.error_logs.contains("EnergyPlus Terminated"):
+            exception = JobExceptionExternalProcess("Energy plus terminated with error")
+            for error_log in self.read_error_logs():
+                exception.add_note(error_log)
             raise exception
-        super().check_for_errors()
+        super().check_for_errors(exited)
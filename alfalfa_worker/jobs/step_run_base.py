@@ -1,25 +1,34 @@
 import logging
+import math
 import os
+from ctypes import c_bool
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from enum import auto
+from multiprocessing import RawValue
+from time import monotonic
 
 from alfalfa_worker.lib.alfalfa_connections_manager import (
     AlafalfaConnectionsManager
 )
 from alfalfa_worker.lib.constants import DATETIME_FORMAT
 from alfalfa_worker.lib.enums import AutoName, RunStatus
+from alfalfa_worker.lib.historian import HistorianWriter
 from alfalfa_worker.lib.job import Job, message
 from alfalfa_worker.lib.job_exception import (
     JobException,
+    JobExceptionMessageHandler,
     JobExceptionSimulation
 )
+from alfalfa_worker.lib.point_io import PointIO
 from alfalfa_worker.lib.utils import to_bool
 
 
 class ClockSource(AutoName):
     INTERNAL = auto()
     EXTERNAL = auto()
+    # Run to the end as fast as possible, for offline studies
+    BATCH = auto()
 
 
 @dataclass
@@ -55,10 +64,15 @@ class Options:
     # How many timesteps can a timescale run lag behind before being stopped
     timescale_lag_limit: int = 2
 
-    def __init__(self, realtime: bool, timescale: int, external_clock: bool, start_datetime: str, end_datetime: str):
+    # How many timesteps a batch run advances between reading inputs and publishing outputs
+    batch_input_interval: int = int(os.environ.get('BATCH_INPUT_INTERVAL', 60))
+
+    def __init__(self, realtime: bool, timescale: int, external_clock: bool, start_datetime: str, end_datetime: str, batch: bool = False):
         self.logger = logging.getLogger(self.__class__.__name__)
 
-        if external_clock:
+        if batch:
+            self.clock_source = ClockSource.BATCH
+        elif external_clock:
             self.clock_source = ClockSource.EXTERNAL
         else:
             self.clock_source = ClockSource.INTERNAL
@@ -79,8 +93,10 @@ class Options:
             self.logger.debug(f"Timescale: {self.timescale}")
 
         # Check for at least one of the required parameters
-        if not realtime and not timescale and not external_clock:
-            raise JobException("At least one of 'external_clock', 'timescale', or 'realtime' must be specified")
+        if not realtime and not timescale and not external_clock and not batch:
+            raise JobException("At least one of 'external_clock', 'timescale', 'realtime', or 'batch' must be specified")
+        if batch and (external_clock or realtime):
+            raise JobException("'batch' cannot be combined with 'external_clock' or 'realtime'")
 
     @property
     def advance_interval(self) -> timedelta:
@@ -100,7 +116,7 @@ class Options:
 
 
 class StepRunBase(Job):
-    def __init__(self, run_id: str, realtime: bool, timescale: int, external_clock: bool, start_datetime: str, end_datetime: str) -> None:
+    def __init__(self, run_id: str, realtime: bool, timescale: int, external_clock: bool, start_datetime: str, end_datetime: str, batch: bool = False) -> None:
         """Base class for all jobs to step a run. The init handles the basic configuration needed
         for the derived classes.
 
@@ -111,10 +127,11 @@ class StepRunBase(Job):
             external_clock (bool): Use an external clock to step the simulation.
             start_datetime (str): Start datetime. #TODO: this should be typed datetime
             end_datetime (str): End datetime. #TODO: this should be typed datetime
+            batch (bool): Run the simulation to the end as fast as possible.
         """
         super().__init__()
         self.set_run_status(RunStatus.STARTING)
-        self.options: Options = Options(to_bool(realtime), int(timescale), to_bool(external_clock), start_datetime, end_datetime)
+        self.options: Options = Options(to_bool(realtime), int(timescale), to_bool(external_clock), start_datetime, end_datetime, to_bool(batch))
 
         self.warmup_cleared = not self.options.warmup_is_first_step
 
@@ -122,11 +139,25 @@ class StepRunBase(Job):
         self.influx_db_name = connections_manager.influx_db_name
         self.influx_client = connections_manager.influx_client
         self.historian_enabled = connections_manager.historian_enabled
+        self.historian = HistorianWriter(self.influx_client, self.influx_db_name) if self.historian_enabled else None
+
+        self.point_io = PointIO()
+
+        # Set while advancing to the start time, in shared memory so a simulation subprocess can read it
+        self._fast_forwarding = RawValue(c_bool, False)
+
+        # Lateness of internal clock advances relative to their deadlines
+        self.timescale_advance_count = 0
+        self.timescale_lag_total = 0.0
+        self.timescale_lag_squared_total = 0.0
+        self.timescale_lag_max = 0.0
 
     def exec(self) -> None:
         self.logger.info("Initializing simulation...")
         self.initialize_simulation()
         self.logger.info("Simulation initialized.")
+        # The web server uses the timestep to know how long advancing to a time can take
+        self.redis.hset(self.run.ref_id, 'timestep_duration', self.options.timestep_duration.total_seconds())
         self.set_run_status(RunStatus.STARTED)
 
         self.logger.info("Advancing to start time...")
@@ -142,41 +173,93 @@ class StepRunBase(Job):
         elif self.options.clock_source == ClockSource.EXTERNAL:
             self.logger.info("Running Simulations with External Clock.")
             self.start_message_loop()
+        elif self.options.clock_source == ClockSource.BATCH:
+            self.logger.info("Running Simulation in Batch.")
+            self.run_batch()
 
     def initialize_simulation(self) -> None:
         """Placeholder for all things necessary to initialize simulation"""
         raise NotImplementedError
 
     def advance_to_start_time(self):
-        while self.run.sim_time < self.options.start_datetime:
-            self.advance()
+        while self.sim_time < self.options.start_datetime:
+            steps = math.ceil((self.options.start_datetime - self.sim_time) / self.options.timestep_duration)
+            self.fast_forward(steps)
             self.warmup_cleared = True
 
+    @property
+    def fast_forwarding(self) -> bool:
+        """Whether the simulation is advancing to the start time.
+        Timesteps before the start time are not read by anyone, so implementations of advance should skip
+        reading inputs and publishing outputs for them, except for the outputs of the last step."""
+        return self._fast_forwarding.value
+
+    def fast_forward(self, steps: int) -> None:
+        """Advance the simulation a number of timesteps with fast_forwarding set.
+        Override to use a faster method of advancing the simulation without I/O.
+
+        Args:
+            steps (int): Number of timesteps to advance.
+        """
+        self._fast_forwarding.value = True
+        try:
+            self.advance(steps=steps)
+        finally:
+            self._fast_forwarding.value = False
+
     def run_timescale(self):
-        """Run simulation at timescale"""
-        next_advance_time = datetime.now() + self.options.advance_interval
+        """Run simulation at timescale.
+        Advances are scheduled against deadlines on the monotonic clock. Between deadlines the job blocks waiting for
+        messages, and each deadline is set from the previous one rather than from when the advance ran, so
+        lateness doesn't accumulate."""
+        advance_interval = self.options.advance_interval.total_seconds()
+        next_advance_time = monotonic() + advance_interval
         self.logger.debug(f"Advance interval is: {self.options.advance_interval}")
-        self.logger.debug(f"Next step time: {next_advance_time}")
 
         while self.is_running:
-            if datetime.now() >= next_advance_time:
-                steps_behind = (datetime.now() - next_advance_time) / self.options.advance_interval
+            now = monotonic()
+            if now >= next_advance_time:
+                lag = now - next_advance_time
+                steps_behind = lag / advance_interval
                 if steps_behind > self.options.timescale_lag_limit:
                     raise JobExceptionSimulation(f"Timescale too high. Simulation more than {self.options.timescale_lag_limit} timesteps behind")
-                next_advance_time = next_advance_time + self.options.advance_interval
+                self._record_timescale_lag(lag)
+                next_advance_time += advance_interval
 
-                self.logger.debug(f"Internal clock called advance at {self.run.sim_time}")
-                self.logger.debug(f"Next advance time: {next_advance_time}")
+                self.logger.debug(f"Internal clock called advance at {self.sim_time}")
                 self.advance()
 
-            if self.check_simulation_stop_conditions() or self.run.sim_time >= self.options.end_datetime:
-                self.logger.debug(f"Stopping at time: {self.run.sim_time}")
+            if self.check_simulation_stop_conditions() or self.sim_time >= self.options.end_datetime:
+                self.logger.debug(f"Stopping at time: {self.sim_time}")
                 self.stop()
                 break
 
-            self._check_messages()
+            self._check_messages(min(max(0, next_advance_time - monotonic()), self.message_wait_time))
         self.logger.info("Internal clock simulation has exited.")
 
+    def run_batch(self):
+        """Run simulation to the end as fast as possible.
+        The simulation advances batch_input_interval timesteps at a time, so inputs are only read and outputs
+        only published once per interval. Messages are handled between intervals."""
+        while self.is_running:
+            if self.check_simulation_stop_conditions() or self.sim_time >= self.options.end_datetime:
+                self.logger.debug(f"Stopping at time: {self.sim_time}")
+                self.stop()
+                break
+
+            remaining_steps = math.ceil((self.options.end_datetime - self.sim_time) / self.options.timestep_duration)
+            self.advance(steps=min(self.options.batch_input_interval, remaining_steps))
+
+            self._check_messages()
+        self.logger.info("Batch simulation has exited.")
+
+    def _record_timescale_lag(self, lag: float) -> None:
+        """Record how many seconds after its deadline an advance of the internal clock started"""
+        self.timescale_advance_count += 1
+        self.timescale_lag_total += lag
+        self.timescale_lag_squared_total += lag ** 2
+        self.timescale_lag_max = max(self.timescale_lag_max, lag)
+
     def get_sim_time(self) -> datetime:
         """Placeholder for method which retrieves time in the simulation"""
         raise NotImplementedError
@@ -191,6 +274,20 @@ class StepRunBase(Job):
         to clean up."""
         return False
 
+    def collect_metrics(self) -> dict:
+        metrics = super().collect_metrics()
+        metrics.update(self.point_io.stats())
+        if self.timescale_advance_count > 0:
+            lag_mean = self.timescale_lag_total / self.timescale_advance_count
+            metrics['timescale_advance_count'] = self.timescale_advance_count
+            metrics['timescale_lag_mean'] = lag_mean
+            metrics['timescale_lag_max'] = self.timescale_lag_max
+            # Standard deviation of the lag
+            metrics['timescale_jitter'] = math.sqrt(max(0, self.timescale_lag_squared_total / self.timescale_advance_count - lag_mean ** 2))
+        if self.historian:
+            metrics.update(self.historian.stats())
+        return metrics
+
     @message
     def stop(self) -> None:
         self.logger.info("Stopping simulation.")
@@ -198,10 +295,46 @@ class StepRunBase(Job):
         self.set_run_status(RunStatus.STOPPING)
 
     def cleanup(self) -> None:
+        if self.historian:
+            self.historian.close()
         super().cleanup()
         self.set_run_status(RunStatus.COMPLETE)
 
     @message
-    def advance(self) -> None:
-        """Placeholder for method which advances the simulation one timestep"""
+    def advance(self, steps: int = 1) -> None:
+        """Placeholder for method which advances the simulation a number of timesteps.
+        Implementations should validate steps with check_advance_steps and respond once all steps are done.
+
+        Args:
+            steps (int): Number of timesteps to advance. Defaults to one.
+        """
         raise NotImplementedError
+
+    @message
+    def advance_to(self, sim_time: str) -> None:
+        """Advance the simulation until it reaches a time.
+
+        Args:
+            sim_time (str): Time to advance to, formatted as '%Y-%m-%d %H:%M:%S'.
+                If it falls within a timestep the simulation advances past it to the end of that timestep.
+        """
+        try:
+            target_time = datetime.strptime(sim_time, DATETIME_FORMAT)
+        except (TypeError, ValueError) as e:
+            raise JobExceptionMessageHandler(f"Invalid time to advance to: {e}") from e
+        if target_time > self.options.end_datetime:
+            raise JobExceptionMessageHandler(f"Cannot advance to {target_time}, which is after the end of the simulation {self.options.end_datetime}")
+        steps = math.ceil((target_time - self.sim_time) / self.options.timestep_duration)
+        if steps < 1:
+            raise JobExceptionMessageHandler(f"Cannot advance to {target_time}, simulation is already at {self.sim_time}")
+        self.advance(steps=steps)
+
+    def check_advance_steps(self, steps: int) -> int:
+        """Validate the number of steps passed to an advance message"""
+        try:
+            steps = int(steps)
+        except (TypeError, ValueError) as e:
+            raise JobExceptionMessageHandler(f"Invalid number of steps to advance: {e}") from e
+        if steps < 1:
+            raise JobExceptionMessageHandler(f"Number of steps to advance must be at least 1, not {steps}")
+        return steps
@@ -1,45 +1,63 @@
+import os
 import threading
-from ctypes import c_wchar_p
+from ctypes import c_longlong
 from datetime import datetime
-from multiprocessing import Manager, Process
-from time import time
+from multiprocessing import Event, Pipe, Process, RawValue, parent_process
+from multiprocessing.connection import wait
+from time import monotonic, process_time
 
 from alfalfa_worker.jobs.step_run_base import StepRunBase
-from alfalfa_worker.lib.constants import DATETIME_FORMAT
 from alfalfa_worker.lib.job import message
 from alfalfa_worker.lib.job_exception import (
     JobExceptionExternalProcess,
     JobExceptionMessageHandler
 )
-from alfalfa_worker.lib.utils import exc_to_str
+from alfalfa_worker.lib.utils import (
+    datetime_to_epoch,
+    epoch_to_datetime,
+    exc_to_str
+)
 
 
 class StepRunProcess(StepRunBase):
     """Extension of StepRunBase with added functionality to handle cases where the simulation being run wants to be in control of the
     process instead of the other way round."""
 
-    def __init__(self, run_id: str, realtime: bool, timescale: int, external_clock: bool, start_datetime: str, end_datetime: str, **kwargs) -> None:
-        super().__init__(run_id, realtime, timescale, external_clock, start_datetime, end_datetime)
+    def __init__(self, run_id: str, realtime: bool, timescale: int, external_clock: bool, start_datetime: str, end_datetime: str, batch: bool = False, **kwargs) -> None:
+        super().__init__(run_id, realtime, timescale, external_clock, start_datetime, end_datetime, batch)
+
+        # Communication between main process and simulation process uses shared memory primitives
+        # which are inherited by the simulation process, so no round trips to a manager process are needed.
 
-        # Create manager to handle communication between main process and simulation process
-        self.manager = Manager()
         # advance_event: set by main process to signal simulation process to advance.
         # Cleared by simulation process immediately before waiting for a new advance event.
-        self.advance_event = self.manager.Event()
+        self.advance_event = Event()
 
         # stop_event: set by main process to signal simulation process to stop
-        self.stop_event = self.manager.Event()
+        self.stop_event = Event()
 
         # running_event: is set by simulation process when the simulation moves out of the warmup stage
-        self.running_event = self.manager.Event()
+        self.running_event = Event()
 
         # error_event: set by simulation process to signal that an error has occurred
-        self.error_event = self.manager.Event()
-        # error_log: contains string serialized errors
-        self.error_log = self.manager.Value(c_wchar_p, '')
+        self.error_event = Event()
+
+        # notification pipe: written to by the simulation process whenever it changes the state of an event,
+        # so the main process can block on it alongside the process sentinel instead of polling events.
+        # string serialized errors are also sent from the simulation process through this pipe.
+        self.notification_reader, self.notification_writer = Pipe(duplex=False)
+        self.error_log = ''
+
+        # advance_steps: number of timesteps the simulation process should take before waiting for the next advance event.
+        # Set by main process before setting the advance_event and counted down by simulation process.
+        self.advance_steps = RawValue(c_longlong, 1)
 
-        # timestamp: string serialized sim_time, set by simulation process after advancing
-        self.timestamp = self.manager.Value(c_wchar_p, '')
+        # continuing_advance: whether the simulation process is in the middle of a multi-step advance.
+        # Inputs are only read at the start of an advance.
+        self.continuing_advance = False
+
+        # timestamp: sim_time in seconds since the epoch, set by simulation process after advancing
+        self.timestamp = RawValue(c_longlong, 0)
 
         # simulation_process: object to contain simulation process
         self.simulation_process: Process
@@ -47,6 +65,14 @@ class StepRunProcess(StepRunBase):
         # in_process: whether the current context is within simulation process or not
         self.in_subprocess = False
 
+        # main_pid: pid of the main process, so the simulation process can tell when it has been orphaned
+        self.main_pid = os.getpid()
+
+        # Time spent by the main process in advance calls
+        self.advance_count = 0
+        self.advance_cpu_time = 0.0
+        self.advance_wall_time = 0.0
+
     def initialize_simulation(self) -> None:
         """Starts simulation process. Waits for running event to be set. And then records updated time."""
         self.simulation_process = Process(target=StepRunProcess._start_simulation_process, args=(self,))
@@ -59,17 +85,25 @@ class StepRunProcess(StepRunBase):
         """In simulation process the sim_time is saved to the shared timestamp.
         In main process this calls the default implementation."""
         if self.in_subprocess:
-            self.timestamp.value = sim_time.strftime(DATETIME_FORMAT)
+            self.timestamp.value = datetime_to_epoch(sim_time)
         else:
             return super().set_run_time(sim_time)
 
+    @property
+    def sim_time(self) -> datetime:
+        """In simulation process the sim_time is read from the shared timestamp.
+        In main process this calls the default implementation."""
+        if self.in_subprocess:
+            return epoch_to_datetime(self.timestamp.value)
+        return super().sim_time
+
     def update_run_time(self) -> None:
         """In simulation process calls default implementation.
         In main process sets run_time to the serialized timestamp from the simulation process."""
         if self.in_subprocess:
             super().update_run_time()
         else:
-            self.set_run_time(datetime.strptime(self.timestamp.value, DATETIME_FORMAT))
+            self.set_run_time(epoch_to_datetime(self.timestamp.value))
 
     def _start_simulation_process(self) -> None:
         try:
@@ -77,6 +111,12 @@ class StepRunProcess(StepRunBase):
             return self.simulation_process_entrypoint()
         except Exception:
             self.report_exception()
+        finally:
+            if self.historian:
+                self.historian.close()
+            # The simulation process exits without running atexit handlers, so write queued log records now
+            if self.log_handler:
+                self.log_handler.flush()
 
     def simulation_process_entrypoint(self) -> None:
         """Placeholder for spinning up the simulation"""
@@ -86,69 +126,148 @@ class StepRunProcess(StepRunBase):
         """This method is called in the main process when an error has been detected in the simulation process.
         It kills the simulation process if it is still alive and raises an exception with the contents of the process
         error log."""
+        self._receive_notifications()
+        # The simulation process sets the error event before sending the log, so allow it time to arrive
+        wait_until = monotonic() + self.options.stop_timeout
+        while not self.error_log and monotonic() < wait_until and self.notification_reader.poll(wait_until - monotonic()):
+            self._receive_notifications()
         if self.simulation_process.is_alive():
             self.simulation_process.kill()
-        raise JobExceptionExternalProcess(self.error_log.value)
+        raise JobExceptionExternalProcess(self.error_log)
 
     def report_exception(self, notes: list[str]) -> None:
         """This method should be called by the subclass, when an exception has occurred
         within the simulation process, to properly record the error log and signal that an error has occurred."""
         if self.in_subprocess:
-            exception_log = exc_to_str()
-            self.error_log.value = exception_log
+            error_log = exc_to_str()
             if len(notes) > 0:
-                self.error_log.value += "\n\n" + '\n'.join(notes)
+                error_log += "\n\n" + '\n'.join(notes)
+            # Set the event before sending so the main process is reading when a large log fills the pipe
             self.error_event.set()
+            self.notification_writer.send(error_log)
+
+    def notify_main_process(self) -> None:
+        """Called in the simulation process after changing the state of an event to wake the main process."""
+        self.notification_writer.send(None)
+
+    def set_running(self) -> None:
+        """Called in the simulation process when the simulation moves out of the warmup stage."""
+        self.running_event.set()
+        self.notify_main_process()
+
+    def wait_for_advance(self) -> bool:
+        """Called in the simulation process to signal the previous advance has completed and block until the next one.
+
+        Returns:
+            bool: False if the simulation should stop instead of advancing.
+        """
+        if self.advance_steps.value > 1:
+            # Continue a multi-step advance without a round trip to the main process
+            self.advance_steps.value -= 1
+            self.continuing_advance = True
+            return not self.stop_event.is_set() and self.main_process_alive()
+        self.continuing_advance = False
+        self.advance_event.clear()
+        self.notify_main_process()
+        # stop sets the advance_event as well, so this only wakes to check the main process is still alive
+        while not self.advance_event.wait(5):
+            if self.stop_event.is_set():
+                break
+            if not self.main_process_alive():
+                self.logger.error("Main process exited, stopping simulation")
+                return False
+        return not self.stop_event.is_set()
+
+    def main_process_alive(self) -> bool:
+        """Called in the simulation process to check that the main process has not exited and left it orphaned."""
+        if os.getppid() != self.main_pid:
+            return False
+        parent = parent_process()
+        return parent is None or parent.is_alive()
+
+    def publish_step(self) -> bool:
+        """Called in the simulation process to check whether the outputs of the current timestep should be published.
+        Outputs are only published on the last timestep of an advance, the timesteps before it are only
+        written to the historian."""
+        return self.advance_steps.value <= 1
+
+    def _receive_notifications(self) -> None:
+        """Drain notifications sent by the simulation process, keeping the most recent error log"""
+        while self.notification_reader.poll():
+            notification = self.notification_reader.recv()
+            if notification is not None:
+                self.error_log = notification
 
     def check_simulation_stop_conditions(self) -> bool:
         return not self.simulation_process.is_alive()
 
-    def check_for_errors(self) -> None:
+    def check_for_errors(self, exited: bool = False) -> None:
         """Checks for errors with the simulation_process and raises an exception if any are detected.
-        This method should be overridden to add additional checks specific to a given process."""
+        This method should be overridden to add additional checks specific to a given process.
+
+        Args:
+            exited (bool): The simulation has exited, so checks should be thorough rather than incremental.
+        """
         exit_code = self.simulation_process.exitcode
         if exit_code:
             raise JobExceptionExternalProcess(f"Simulation process exited with non-zero exit code: {exit_code}")
 
     def _wait_for_event(self, event: threading.Event, timeout: float, desired_event_set: bool = False) -> None:
-        """Wait for a given event to go be set or cleared within a given amount of time"""
-        wait_until = time() + timeout
-        while (event.is_set() != desired_event_set
-               and time() < wait_until
-               and self.simulation_process.is_alive()
-               and not self.error_event.is_set()):
-            self.check_for_errors()
-            if desired_event_set:
-                event.wait(1)
-        if self.error_event.is_set():
-            self.handle_process_error()
-        if not self.simulation_process.is_alive():
+        """Wait for a given event to go be set or cleared within a given amount of time.
+        Blocks on notifications from the simulation process and its sentinel, so no time is spent polling."""
+        wait_until = monotonic() + timeout
+        while event.is_set() != desired_event_set:
+            if self.error_event.is_set():
+                self.handle_process_error()
+            if not self.simulation_process.is_alive():
+                self.check_for_errors(exited=True)
+                raise JobExceptionExternalProcess("Simulation process exited without returning an error")
+            remaining = wait_until - monotonic()
+            if remaining <= 0:
+                self.simulation_process.kill()
+                raise TimeoutError("Timedout waiting for simulation process to toggle event")
+            wait([self.notification_reader, self.simulation_process.sentinel], remaining)
+            self._receive_notifications()
             self.check_for_errors()
-            raise JobExceptionExternalProcess("Simulation process exited without returning an error")
-        if time() > wait_until:
-            self.simulation_process.kill()
-            raise TimeoutError("Timedout waiting for simulation process to toggle event")
 
     @message
-    def advance(self) -> None:
-        self.logger.info(f"Advance called at {self.run.sim_time}")
+    def advance(self, steps: int = 1) -> None:
+        steps = self.check_advance_steps(steps)
+        self.logger.info(f"Advance of {steps} steps called at {self.sim_time}")
         if self.advance_event.is_set():
             raise JobExceptionMessageHandler("Cannot advance, simulation is already advancing")
+        start_cpu_time = process_time()
+        start_wall_time = monotonic()
+        self.advance_steps.value = steps
         self.advance_event.set()
-        self._wait_for_event(self.advance_event, timeout=self.options.advance_timeout, desired_event_set=False)
+        self._wait_for_event(self.advance_event, timeout=self.options.advance_timeout * steps, desired_event_set=False)
         self.update_run_time()
+        self.advance_count += 1
+        self.advance_cpu_time += process_time() - start_cpu_time
+        self.advance_wall_time += monotonic() - start_wall_time
+
+    def collect_metrics(self) -> dict:
+        metrics = super().collect_metrics()
+        metrics['advance_count'] = self.advance_count
+        if self.advance_count > 0:
+            metrics['advance_cpu_time_mean'] = self.advance_cpu_time / self.advance_count
+            metrics['advance_wall_time_mean'] = self.advance_wall_time / self.advance_count
+        return metrics
 
     @message
     def stop(self):
         if not self.stop_event.is_set():
-            stop_start_time = time()
+            wait_until = monotonic() + self.options.stop_timeout
             self.stop_event.set()
+            # Wake the simulation process if it is waiting to advance
+            self.advance_event.set()
             while (self.simulation_process.is_alive()
-                   and time() - stop_start_time < self.options.stop_timeout
+                   and monotonic() < wait_until
                    and not self.error_event.is_set()):
-                pass
-            if time() - stop_start_time > self.options.stop_timeout and self.simulation_process.is_alive():
-                self.simulation_process.kill()
-                raise JobExceptionExternalProcess("Simulation process stopped responding and was killed.")
+                wait([self.notification_reader, self.simulation_process.sentinel], wait_until - monotonic())
+                self._receive_notifications()
             if self.error_event.is_set():
                 self.handle_process_error()
+            if self.simulation_process.is_alive():
+                self.simulation_process.kill()
+                raise JobExceptionExternalProcess("Simulation process stopped responding and was killed.")
@@ -0,0 +1,109 @@
+import gzip
+import os
+import tarfile
+from contextlib import ExitStack, contextmanager
+from enum import auto
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator
+
+import zstandard
+
+from alfalfa_worker.lib.enums import AutoName
+
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+class ArchiveFormat(AutoName):
+    """Compression used for the tar archives of runs"""
+    # Single threaded gzip, readable by any tar implementation
+    GZ = auto()
+    # Multithreaded zstandard
+    ZST = auto()
+    # No compression, for runs which are mostly already compressed files
+    NONE = auto()
+
+    @classmethod
+    def from_env(cls) -> "ArchiveFormat":
+        """Get the format selected by RUN_ARCHIVE_FORMAT, defaulting to gz"""
+        value = os.environ.get('RUN_ARCHIVE_FORMAT', 'gz')
+        try:
+            return cls(value.upper())
+        except ValueError:
+            formats = ', '.join(archive_format.value.lower() for archive_format in cls)
+            raise ValueError(f"Invalid RUN_ARCHIVE_FORMAT '{value}', must be one of {formats}") from None
+
+    @property
+    def extension(self) -> str:
+        """File extension of archives in this format"""
+        return {
+            ArchiveFormat.GZ: '.tar.gz',
+            ArchiveFormat.ZST: '.tar.zst',
+            ArchiveFormat.NONE: '.tar'
+        }[self]
+
+
+def write_archive(file: BinaryIO, path: os.PathLike, arcname: str,
+                  archive_format: ArchiveFormat = None, level: int = None,
+                  filter: Callable[[tarfile.TarInfo], tarfile.TarInfo] = None) -> None:
+    """Write a directory to a stream as a tar archive.
+
+    Args:
+        file (BinaryIO): Stream to write the archive to. It is not closed.
+        path (os.PathLike): Directory to archive.
+        arcname (str): Name of the directory in the archive.
+        archive_format (ArchiveFormat): Compression of the archive. Defaults to RUN_ARCHIVE_FORMAT.
+        level (int): Compression level. Defaults to RUN_ARCHIVE_LEVEL or the default of the compressor.
+        filter (Callable[[tarfile.TarInfo], tarfile.TarInfo]): Filter applied to each member of the archive.
+    """
+    archive_format = archive_format or ArchiveFormat.from_env()
+    if level is None and 'RUN_ARCHIVE_LEVEL' in os.environ:
+        level = int(os.environ['RUN_ARCHIVE_LEVEL'])
+
+    with ExitStack() as stack:
+        if archive_format == ArchiveFormat.GZ:
+            file = stack.enter_context(gzip.GzipFile(fileobj=file, mode='wb', compresslevel=9 if level is None else level))
+        elif archive_format == ArchiveFormat.ZST:
+            compressor = zstandard.ZstdCompressor(level=3 if level is None else level,
+                                                  threads=int(os.environ.get('RUN_ARCHIVE_THREADS', -1)))
+            file = stack.enter_context(compressor.stream_writer(file, closefd=False))
+        tar = stack.enter_context(tarfile.open(fileobj=file, mode='w|'))
+        tar.add(Path(path), filter=filter, arcname=arcname)
+
+
+@contextmanager
+def open_archive(file: BinaryIO) -> Iterator[tarfile.TarFile]:
+    """Open a stream of a tar archive for reading, detecting its compression from the first bytes.
+
+    Args:
+        file (BinaryIO): Stream of an archive written by write_archive.
+
+    Yields:
+        tarfile.TarFile: Archive opened in streaming mode.
+    """
+    magic = file.read(len(ZSTD_MAGIC))
+    file = _PrefixedReader(magic, file)
+    with ExitStack() as stack:
+        if magic.startswith(ZSTD_MAGIC):
+            file = stack.enter_context(zstandard.ZstdDecompressor().stream_reader(file, closefd=False))
+        # tarfile detects gzip, bz2 and xz compression on its own
+        yield stack.enter_context(tarfile.open(fileobj=file, mode='r|*'))
+
+
+class _PrefixedReader:
+    """Stream which returns bytes that have already been read from another stream before the rest of it"""
+
+    def __init__(self, prefix: bytes, file: BinaryIO) -> None:
+        self.prefix = prefix
+        self.file = file
+
+    def read(self, size: int = -1) -> bytes:
+        if len(self.prefix) == 0:
+            return self.file.read(size)
+        if size < 0:
+            data = self.prefix + self.file.read()
+        else:
+            data = self.prefix[:size]
+            if len(data) < size:
+                data += self.file.read(size - len(data))
+        self.prefix = self.prefix[len(data):]
+        return data
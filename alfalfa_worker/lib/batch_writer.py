@@ -0,0 +1,158 @@
+import os
+import threading
+from collections import deque
+from ctypes import c_ulonglong
+from enum import auto
+from multiprocessing import RawValue
+from typing import Any
+
+from alfalfa_worker.lib.enums import AutoName
+
+
+class DropPolicy(AutoName):
+    """What to do with new items when the queue of a BatchWriter is full"""
+    # Discard the oldest queued items to make room
+    DROP_OLDEST = auto()
+    # Discard the new items
+    DROP_NEWEST = auto()
+    # Block the caller until there is room in the queue
+    BLOCK = auto()
+
+
+class BatchWriter:
+    """Base class for writing items in batches from a background thread so a slow backend does not stall the caller.
+
+    Items are held in a bounded queue and written in batches, either when a full batch is
+    available or when the flush interval elapses after the first item is queued. The thread is started
+    lazily in whichever process first queues items, so a writer created in a job can be used from a
+    simulation subprocess. Counters live in shared memory so they can be read from the job process.
+
+    Subclasses implement _write to send a batch."""
+
+    thread_name = "BatchWriter"
+
+    def __init__(self, max_queue_size: int, batch_size: int, flush_interval: float,
+                 drop_policy: DropPolicy = DropPolicy.DROP_OLDEST) -> None:
+        """
+        Args:
+            max_queue_size (int): Maximum number of items held in the queue.
+            batch_size (int): Maximum number of items sent in a single write.
+            flush_interval (float): Maximum seconds an item waits in the queue.
+            drop_policy (DropPolicy): Behavior when the queue is full.
+        """
+        if max_queue_size < 1 or batch_size < 1:
+            raise ValueError(f"{self.thread_name} queue size and batch size must be at least 1, got {max_queue_size} and {batch_size}")
+        if flush_interval < 0:
+            raise ValueError(f"{self.thread_name} flush interval must not be negative, got {flush_interval}")
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+
+        # Total items which have been queued, dropped, written successfully and failed to write
+        self._queued = RawValue(c_ulonglong, 0)
+        self._dropped = RawValue(c_ulonglong, 0)
+        self._written = RawValue(c_ulonglong, 0)
+        self._failed = RawValue(c_ulonglong, 0)
+
+        self._pid = None
+        self._thread: threading.Thread = None
+        self._start_lock = threading.Lock()
+
+    def put(self, items: list[Any]) -> None:
+        """Queue items to be written"""
+        if len(items) == 0:
+            return
+        self._start()
+        with self._condition:
+            for item in items:
+                if len(self._queue) >= self.max_queue_size:
+                    if self.drop_policy == DropPolicy.DROP_NEWEST:
+                        self._dropped.value += 1
+                        continue
+                    elif self.drop_policy == DropPolicy.DROP_OLDEST:
+                        self._queue.popleft()
+                        self._dropped.value += 1
+                    elif self.drop_policy == DropPolicy.BLOCK:
+                        self._condition.notify_all()
+                        self._condition.wait_for(lambda: len(self._queue) < self.max_queue_size)
+                self._queue.append(item)
+                self._queued.value += 1
+            # Wake the thread when items start arriving and when a batch is full
+            self._condition.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait for all queued items to be written.
+
+        Returns:
+            bool: True if the queue was emptied before the timeout.
+        """
+        if not self._is_started():
+            return True
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            return self._condition.wait_for(lambda: len(self._queue) == 0 and not self._writing, timeout)
+
+    def close(self, timeout: float = None) -> None:
+        """Write all queued items and stop the background thread"""
+        if not self._is_started():
+            return
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        self._pid = None
+
+    def _write(self, batch: list[Any]) -> bool:
+        """Write a batch of items.
+
+        Returns:
+            bool: True if the batch was written successfully.
+        """
+        raise NotImplementedError
+
+    def _is_started(self) -> bool:
+        return self._pid == os.getpid() and self._thread is not None
+
+    def _start(self) -> None:
+        if self._is_started():
+            return
+        with self._start_lock:
+            if self._is_started():
+                return
+            self._queue = deque()
+            self._condition = threading.Condition()
+            self._closing = False
+            self._writing = False
+            self._flush_requested = False
+            self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._closing or len(self._queue) > 0)
+                # Give items time to accumulate into a batch
+                self._condition.wait_for(lambda: self._closing or self._flush_requested or len(self._queue) >= self.batch_size,
+                                         timeout=self.flush_interval)
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                if len(self._queue) == 0:
+                    self._flush_requested = False
+                closing = self._closing and len(self._queue) == 0
+                self._writing = len(batch) > 0
+                # Wake any producers blocked on a full queue
+                self._condition.notify_all()
+
+            if len(batch) > 0:
+                if self._write(batch):
+                    self._written.value += len(batch)
+                else:
+                    self._failed.value += len(batch)
+
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+            if closing:
+                break
@@ -0,0 +1,154 @@
+'''
+This module contains the Data_Cache class which stores the test case data
+parsed by the Data_Manager on disk so that it only needs to be parsed once
+per test case FMU.
+
+'''
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Version of the layout of the cached files, increment it when the layout
+# or the parsing of the data changes so that old entries are not loaded.
+FORMAT_VERSION = 1
+
+
+class Data_Cache(object):
+    ''' This class stores the year long test case data and the kpis.json of
+    a test case FMU as a binary sidecar, keyed by the inputs used to parse it.
+    The data is stored with one contiguous row per variable so that it
+    can be memory mapped and each variable read without copying.
+
+    '''
+
+    def __init__(self, cache_dir=None, float32=None):
+        '''Initialize the Data_Cache class.
+
+        Parameters
+        ----------
+        cache_dir : str (optional)
+            Directory in which to store the cached data. Defaults to
+            BOPTEST_DATA_CACHE_DIR or a directory in the system temporary directory.
+        float32 : Boolean (optional)
+            True to store the data in single precision to halve its size.
+            Defaults to BOPTEST_DATA_CACHE_FLOAT32.
+
+        '''
+
+        if cache_dir is None:
+            cache_dir = os.environ.get('BOPTEST_DATA_CACHE_DIR',
+                                       os.path.join(tempfile.gettempdir(), 'boptest_data'))
+        if float32 is None:
+            float32 = os.environ.get('BOPTEST_DATA_CACHE_FLOAT32', 'false').lower() == 'true'
+        self.cache_dir = cache_dir
+        self.dtype = np.float32 if float32 else np.float64
+
+    @staticmethod
+    def hash_file(path):
+        '''Compute the content hash of a file.'''
+
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def make_key(self, fmu_path, categories):
+        '''Compute the cache key of the data of a test case.
+
+        Parameters
+        ----------
+        fmu_path : str
+            Path to the test case FMU, which includes its data and kpis.json.
+        categories : dict
+            Data categories used to parse the data, from categories.json.
+
+        Returns
+        -------
+        key : str
+            Hash of the FMU, the categories, the data type and FORMAT_VERSION.
+
+        '''
+
+        sha = hashlib.sha256()
+        sha.update(self.hash_file(fmu_path).encode())
+        sha.update(json.dumps(categories, sort_keys=True).encode())
+        sha.update(np.dtype(self.dtype).name.encode())
+        sha.update(str(FORMAT_VERSION).encode())
+        return sha.hexdigest()
+
+    def load(self, key):
+        '''Load cached test case data.
+
+        Parameters
+        ----------
+        key : str
+            Cache key from make_key.
+
+        Returns
+        -------
+        data : pandas DataFrame or None
+            Memory mapped test case data indexed by time, or None if it
+            is not cached.
+        kpi_json : dict or None
+            Contents of the kpis.json of the test case.
+
+        '''
+
+        try:
+            with open(self._metadata_path(key), 'r') as f:
+                metadata = json.load(f)
+            values = np.load(self._data_path(key), mmap_mode='r')
+            index = np.load(self._index_path(key))
+        except (OSError, ValueError):
+            return None, None
+        index = pd.Index(index, name='time')
+        # The transpose is a column major view of the rows of each variable
+        data = pd.DataFrame(values.T, index=index, columns=metadata['columns'], copy=False)
+        return data, metadata['kpi_json']
+
+    def save(self, key, data, kpi_json):
+        '''Store test case data in the cache.
+
+        Parameters
+        ----------
+        key : str
+            Cache key from make_key.
+        data : pandas DataFrame
+            Test case data indexed by time.
+        kpi_json : dict
+            Contents of the kpis.json of the test case.
+
+        '''
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        metadata = {'columns': list(data.columns), 'kpi_json': kpi_json}
+
+        # Write to temporary files first so a partially written cache is never loaded.
+        # The metadata is written last because it marks the entry as complete.
+        self._save_array(self._index_path(key), data.index.to_numpy())
+        self._save_array(self._data_path(key), data.to_numpy(dtype=self.dtype).T)
+        metadata_tmp = '{0}.{1}.tmp'.format(self._metadata_path(key), os.getpid())
+        with open(metadata_tmp, 'w') as f:
+            json.dump(metadata, f)
+        os.replace(metadata_tmp, self._metadata_path(key))
+
+    @staticmethod
+    def _save_array(path, array):
+        tmp_path = '{0}.{1}.tmp.npy'.format(path, os.getpid())
+        np.save(tmp_path, np.ascontiguousarray(array))
+        os.replace(tmp_path, path)
+
+    def _index_path(self, key):
+        return os.path.join(self.cache_dir, key + '.index.npy')
+
+    def _data_path(self, key):
+        return os.path.join(self.cache_dir, key + '.npy')
+
+    def _metadata_path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
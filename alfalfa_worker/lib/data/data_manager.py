@@ -19,6 +19,8 @@ import numpy as np
 import pandas as pd
 from scipy import interpolate
 
+from alfalfa_worker.lib.data.data_cache import Data_Cache
+
 
 class Data_Manager(object):
     ''' This class has the functionality to store and retrieve the data
@@ -45,6 +47,8 @@ class Data_Manager(object):
 
         # Point to the test case object
         self.case = testcase
+        # Arrays used to interpolate the test case data, built on first use
+        self._interpolation_data = None
 
         # Find path to data directory
         data_dir = os.path.join(
@@ -180,14 +184,16 @@ class Data_Manager(object):
         Returns
         -------
         data: dict
-            Dictionary with the requested forecast data
+            Dictionary with the requested forecast data as numpy arrays,
+            including the 'time' of each point.
             {<variable_name>:<variable_forecast_trajectory>}
 
         Notes
         -----
         The read and pre-process of the data happens only
         once (at load_data_and_kpisjson) to reduce the computational
-        load during the co-simulation
+        load during the co-simulation. The arrays used for the
+        interpolation are also built only once.
 
         '''
 
@@ -197,9 +203,9 @@ class Data_Manager(object):
 
         # Filter the requested data columns
         if category is not None:
-            data_slice = self.case.data.loc[:, self.categories[category]]
+            keys = self.categories[category]
         else:
-            data_slice = self.case.data
+            keys = self.case.data.keys()
 
         # If no index use horizon and interval
         if index is None:
@@ -210,39 +216,91 @@ class Data_Manager(object):
             if interval is None:
                 interval = self.case.step
             index = np.arange(start, stop, interval).astype(int)
+        index = np.asarray(index)
+
+        time, columns = self._get_interpolation_data()
+        if len(index) > 0 and (index.min() < time[0] or index.max() > time[-1]):
+            raise ValueError('The requested index is outside of the test case data.')
+        # Only interpolate within the window of data that covers the index
+        if len(index) > 0:
+            lo = max(np.searchsorted(time, index.min(), side='right') - 1, 0)
+            hi = np.searchsorted(time, index.max(), side='left') + 1
+        else:
+            lo = hi = 0
+        time = time[lo:hi]
 
-        # Reindex to the desired index
-        data_slice_reindexed = data_slice.reindex(index)
-
-        for key in data_slice_reindexed.keys():
+        data = {'time': index}
+        for key in keys:
+            values = columns[key][lo:hi]
             # Use linear interpolation for continuous variables
             if key in self.categories['weather']:
-                f = interpolate.interp1d(self.case.data.index,
-                                         self.case.data[key], kind='linear')
+                data[key] = np.interp(index, time, values)
             # Use forward fill for discrete variables
             else:
-                f = interpolate.interp1d(self.case.data.index,
-                                         self.case.data[key], kind='zero')
-            data_slice_reindexed.loc[:, key] = f(index)
+                data[key] = values[np.searchsorted(time, index, side='right') - 1]
 
         if plot:
-            if category is None:
-                to_plot = data_slice_reindexed.keys()
-            else:
-                to_plot = self.categories[category]
-            for var in to_plot:
-                data_slice_reindexed[var].plot()
+            for var in keys:
+                plt.plot(index, data[var], label=var)
                 plt.legend()
                 plt.show()
 
-        # Reset the index to keep the 'time' column in the data
-        # Transform data frame to dictionary
-        return data_slice_reindexed.reset_index().to_dict('list')
+        return data
+
+    def _get_interpolation_data(self):
+        '''Get the time and values of each variable of the test case data
+        as numpy arrays. These are built once since the test case data does
+        not change.
+
+        Returns
+        -------
+        time : numpy array
+            Time of each row of the test case data in seconds.
+        columns : dict
+            Dictionary of variable names and their values.
+
+        '''
+
+        # Rebuild if the test case data has been reloaded
+        if self._interpolation_data is None or self._interpolation_data[0] is not self.case.data:
+            columns = {key: self.case.data[key].to_numpy(dtype=float) for key in self.case.data.keys()}
+            self._interpolation_data = (self.case.data,
+                                        self.case.data.index.to_numpy(),
+                                        columns)
+        return self._interpolation_data[1:]
 
     def load_data_and_kpisjson(self):
         '''Load the data and kpis.json from the resources folder of the fmu.
         Resample it with the specified time interval.
 
+        The parsed data is cached on disk keyed by the hash of the fmu and
+        the data categories, so that it is only parsed once for each test case.
+
+        '''
+
+        data_cache = Data_Cache()
+        key = data_cache.make_key(self.case.fmupath, self.categories)
+        data, kpi_json = data_cache.load(key)
+        if data is None:
+            data, kpi_json = self._parse_data_and_kpisjson()
+            try:
+                data_cache.save(key, data, kpi_json)
+            except OSError as e:
+                warnings.warn('Unable to cache the test case data: {0}'.format(e), Warning)
+
+        self.case.kpi_json = kpi_json
+        self.case.data = data
+
+    def _parse_data_and_kpisjson(self):
+        '''Parse the data and kpis.json from the resources folder of the fmu.
+
+        Returns
+        -------
+        data : pandas DataFrame
+            Test case data resampled for one year.
+        kpi_json : dict
+            Contents of the kpis.json file.
+
         '''
 
         # Point to the fmu zip file
@@ -252,18 +310,20 @@ class Data_Manager(object):
 
         # Load kpi json
         json_str = z_fmu.open('resources/kpis.json').read()
-        self.case.kpi_json = json.loads(json_str)
+        kpi_json = json.loads(json_str)
 
-        # Find the test case data files
-        files = []
+        # Read the test case data files
+        dfs = {}
         for f in z_fmu.namelist():
             if f.startswith('resources/') and f.endswith('.csv'):
-                files.append(f)
+                dfs[f] = pd.read_csv(z_fmu.open(f), comment='#')
+
+        # Close the fmu
+        z_fmu.close()
 
         # Find the minimum sampling resolution
         sampling = 3600.
-        for f in files:
-            df = pd.read_csv(z_fmu.open(f), comment='#')
+        for df in dfs.values():
             if 'time' in df.keys():
                 new_sampling = df.iloc[1]['time'] - df.iloc[0]['time']
                 if new_sampling < sampling:
@@ -278,12 +338,10 @@ class Data_Manager(object):
             all_keys.extend(self.categories[category])
 
         # Initialize test case data frame
-        self.case.data = \
-            pd.DataFrame(index=index, columns=all_keys).rename_axis('time')
+        data = pd.DataFrame(index=index, columns=all_keys).rename_axis('time')
 
         # Load the test case data
-        for f in files:
-            df = pd.read_csv(z_fmu.open(f), comment='#')
+        for f, df in dfs.items():
             keys = df.keys()
             if 'time' in keys:
                 for key in keys.drop('time'):
@@ -293,25 +351,20 @@ class Data_Manager(object):
                                 category == 'weather':
                             g = interpolate.interp1d(df['time'], df[key],
                                                      kind='linear')
-                            self.case.data.loc[:, key] = \
-                                g(self.case.data.index)
+                            data.loc[:, key] = g(data.index)
                         # Use forward fill for discrete variables
                         elif key in self.categories[category]:
                             g = interpolate.interp1d(df['time'], df[key],
                                                      kind='zero')
-                            self.case.data.loc[:, key] = \
-                                g(self.case.data.index)
+                            data.loc[:, key] = g(data.index)
             else:
                 warnings.warn('The following file does not have '
                               'time column and therefore no data is going to '
                               'be used from this file as test case data.', Warning)
                 print(f)
 
-        # Close the fmu
-        z_fmu.close()
-
         # Convert any string formatted numbers to floats.
-        self.case.data = self.case.data.applymap(float)
+        return data.astype(float), kpi_json
 
 
 if __name__ == "__main__":
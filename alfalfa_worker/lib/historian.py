@@ -0,0 +1,59 @@
+import logging
+import os
+
+from alfalfa_worker.lib.batch_writer import BatchWriter, DropPolicy
+
+
+class HistorianWriter(BatchWriter):
+    """Writes points to InfluxDB from a background thread so a slow historian does not stall the simulation.
+
+    Points are queued and written in batches by the BatchWriter base class."""
+
+    thread_name = "HistorianWriter"
+
+    def __init__(self, influx_client, database: str,
+                 max_queue_size: int = None, batch_size: int = None,
+                 flush_interval: float = None, drop_policy: DropPolicy = None) -> None:
+        """
+        Args:
+            influx_client (InfluxDBClient): Client used to write points.
+            database (str): Name of the InfluxDB database to write to.
+            max_queue_size (int): Maximum number of points held in the queue. Defaults to HISTORIAN_QUEUE_SIZE or 100000.
+            batch_size (int): Maximum number of points sent in a single write. Defaults to HISTORIAN_BATCH_SIZE or 5000.
+            flush_interval (float): Maximum seconds a point waits in the queue. Defaults to HISTORIAN_FLUSH_INTERVAL or 5.
+            drop_policy (DropPolicy): Behavior when the queue is full. Defaults to HISTORIAN_DROP_POLICY or DROP_OLDEST.
+        """
+        super().__init__(
+            max_queue_size if max_queue_size is not None else int(os.environ.get('HISTORIAN_QUEUE_SIZE', 100000)),
+            batch_size if batch_size is not None else int(os.environ.get('HISTORIAN_BATCH_SIZE', 5000)),
+            flush_interval if flush_interval is not None else float(os.environ.get('HISTORIAN_FLUSH_INTERVAL', 5)),
+            drop_policy if drop_policy is not None else DropPolicy(os.environ.get('HISTORIAN_DROP_POLICY', DropPolicy.DROP_OLDEST.value)))
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.influx_client = influx_client
+        self.database = database
+
+    def write_points(self, points: list[dict]) -> None:
+        """Queue points to be written to the historian"""
+        self.put(points)
+
+    def stats(self) -> dict:
+        return {
+            'historian_queued': self._queued.value,
+            'historian_dropped': self._dropped.value,
+            'historian_written': self._written.value,
+            'historian_failed': self._failed.value
+        }
+
+    def _write(self, batch: list[dict]) -> bool:
+        try:
+            response = self.influx_client.write_points(points=batch,
+                                                       time_precision='s',
+                                                       database=self.database)
+        except Exception as e:
+            self.logger.error(f"Influx error writing {len(batch)} points: {e}")
+            return False
+        if not response:
+            self.logger.warning(f"Unsuccessful write to influx.  Response: {response}")
+            return False
+        self.logger.debug(f"Successful write to influx.  Number of points: {len(batch)}")
+        return True
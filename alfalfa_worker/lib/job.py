@@ -20,7 +20,11 @@ from alfalfa_worker.lib.job_exception import (
 )
 from alfalfa_worker.lib.models import Run
 from alfalfa_worker.lib.redis_log_handler import RedisLogHandler
-from alfalfa_worker.lib.utils import exc_to_str
+from alfalfa_worker.lib.utils import (
+    datetime_to_epoch,
+    epoch_to_datetime,
+    exc_to_str
+)
 
 
 def message(func):
@@ -69,6 +73,11 @@ class JobMetaclass(type):
 
             # Variables
             self.run = None
+            self.log_handler: RedisLogHandler = None
+            # Simulation time of the run in seconds since the epoch, see sim_time
+            self._sim_timestamp: int = None
+            self._message_checks = 0
+            self._message_checks_start = None
 
             connections_manager = AlafalfaConnectionsManager()
 
@@ -118,6 +127,9 @@ def error_wrapper(func):
 class Job(metaclass=JobMetaclass):
     """Job Base Class"""
 
+    # Longest time in seconds the message loop blocks waiting for a message before checking whether the job is still running
+    message_wait_time: float = 1
+
     @error_wrapper
     def start(self) -> None:
         """Job workflow"""
@@ -148,6 +160,23 @@ class Job(metaclass=JobMetaclass):
         """Stop job"""
         self.set_job_status(JobStatus.STOPPING)
 
+    @message
+    def get_metrics(self) -> dict:
+        """Get performance counters of the job"""
+        return self.collect_metrics()
+
+    def collect_metrics(self) -> dict:
+        """Gather performance counters of the job.
+        Override and extend the result of super() to add counters."""
+        metrics = {'message_checks': self._message_checks}
+        if self._message_checks_start is not None:
+            elapsed = time() - self._message_checks_start
+            if elapsed > 0:
+                metrics['message_checks_per_second'] = self._message_checks / elapsed
+        if self.log_handler:
+            metrics.update(self.log_handler.stats())
+        return metrics
+
     def validate(self) -> None:
         """Placeholder method for validating a job completed successfully.
         It is recommended to validate using assert statements"""
@@ -192,15 +221,28 @@ class Job(metaclass=JobMetaclass):
         # Should the timeout be total time since loop started? or time since last message?
         start_time = time()
         while self.is_running and self.run is not None:
-            if timeout is not None and time() - start_time > timeout:
-                break
+            wait_time = self.message_wait_time
+            if timeout is not None:
+                remaining = timeout - (time() - start_time)
+                if remaining < 0:
+                    break
+                wait_time = min(wait_time, remaining)
+            # Status is only written to redis when it changes
             self.set_job_status(JobStatus.WAITING)
-            self._check_messages()
+            self._check_messages(wait_time)
         self.logger.info("message loop over")
 
     @with_run()
-    def _check_messages(self) -> None:
-        message = self.redis_pubsub.get_message()
+    def _check_messages(self, timeout: float = 0) -> None:
+        """Handle a message if one is available.
+
+        Args:
+            timeout (float): Seconds to block waiting for a message. Defaults to not blocking.
+        """
+        if self._message_checks_start is None:
+            self._message_checks_start = time()
+        self._message_checks += 1
+        message = self.redis_pubsub.get_message(timeout=timeout)
         try:
             if message and message['data'].__class__ == bytes:
                 self.logger.info(f"received message: {message}")
@@ -215,7 +257,9 @@ class Job(metaclass=JobMetaclass):
                         self.set_job_status(JobStatus.RUNNING)
                     response = {}
                     try:
-                        response['response'] = self._message_handlers[data['method']](**data.get('params', {}))
+                        # The web sends parameters of messages as data
+                        params = data.get('params', data.get('data')) or {}
+                        response['response'] = self._message_handlers[data['method']](**params)
                         response['status'] = 'ok'
                     except JobExceptionMessageHandler:
                         # JobExceptionMessageHandler errors are thrown when the operation fails but the job isn't tainted.
@@ -258,9 +302,24 @@ class Job(metaclass=JobMetaclass):
         self.run.status = status
         self.run.save()
 
+    @property
+    def sim_time(self) -> datetime:
+        """Current simulation time of the run.
+        The job is the only writer of the time, so it is kept in the process and only read from redis once."""
+        if self._sim_timestamp is None:
+            sim_time = self.run.sim_time if self.run else None
+            if sim_time is None:
+                return None
+            self._sim_timestamp = datetime_to_epoch(sim_time)
+        return epoch_to_datetime(self._sim_timestamp)
+
     @with_run()
     def set_run_time(self, sim_time: datetime) -> None:
-        self.run.sim_time = sim_time
+        timestamp = datetime_to_epoch(sim_time)
+        # Only write through to redis when the time changes
+        if timestamp != self._sim_timestamp:
+            self._sim_timestamp = timestamp
+            self.run.sim_time = sim_time
 
     @with_run(return_on_fail=True)
     def record_run_error(self, error_log: str) -> None:
@@ -280,9 +339,9 @@ class Job(metaclass=JobMetaclass):
         fh.setFormatter(formatter)
         self.logger.addHandler(fh)
 
-        redis_handler = RedisLogHandler(self.run, logging.INFO)
-        redis_handler.setFormatter(formatter)
-        self.logger.addHandler(redis_handler)
+        self.log_handler = RedisLogHandler(self.run, logging.INFO)
+        self.log_handler.setFormatter(formatter)
+        self.logger.addHandler(self.log_handler)
 
     def log_subprocess(self, args: list[str], timeout: int = 300):
         self.logger.info(f"Executing process with args: '{args}'")
@@ -0,0 +1,63 @@
+import math
+from ctypes import c_double
+from multiprocessing import RawArray, RawValue
+from typing import Iterable, Mapping, Sequence
+
+import numpy as np
+from scipy.integrate import trapezoid
+
+
+class KPIAccumulator:
+    """Keeps running integrals of a set of signals so KPIs can be read in constant time
+    no matter how long a simulation has run.
+
+    Signals are either integrated over time with the trapezoidal rule, as new samples arrive, or summed
+    when each value is already the integral over a timestep, as with EnergyPlus meters.
+    Integrals live in shared memory so that a simulation subprocess can update them
+    while the job process reads them."""
+
+    def __init__(self, signals: Iterable[str]) -> None:
+        """
+        Args:
+            signals (Iterable[str]): Names of the signals to integrate.
+        """
+        self.signals = list(signals)
+        self._columns = {signal: column for column, signal in enumerate(self.signals)}
+        self._integrals = RawArray(c_double, len(self.signals))
+        self._last_values = RawArray(c_double, len(self.signals))
+        self._last_time = RawValue(c_double, math.nan)
+
+    def update(self, times: Sequence[float], values: Mapping[str, Sequence[float]]) -> None:
+        """Integrate new samples of the signals, continuing from the last sample.
+
+        Args:
+            times (Sequence[float]): Times of the new samples in seconds.
+            values (Mapping[str, Sequence[float]]): New samples of every signal.
+        """
+        times = np.asarray(times, dtype=float)
+        if len(times) == 0:
+            return
+        has_last = not math.isnan(self._last_time.value)
+        if has_last:
+            times = np.concatenate(([self._last_time.value], times))
+        for signal, column in self._columns.items():
+            samples = np.asarray(values[signal], dtype=float)
+            if has_last:
+                samples = np.concatenate(([self._last_values[column]], samples))
+            if len(samples) > 1:
+                self._integrals[column] += trapezoid(samples, times)
+            self._last_values[column] = samples[-1]
+        self._last_time.value = times[-1]
+
+    def add(self, values: Mapping[str, float]) -> None:
+        """Add values which are already integrated over a timestep.
+
+        Args:
+            values (Mapping[str, float]): Value of each signal over the last timestep.
+        """
+        for signal, value in values.items():
+            if value is not None and not math.isnan(value):
+                self._integrals[self._columns[signal]] += value
+
+    def integral(self, signal: str) -> float:
+        return self._integrals[self._columns[signal]]
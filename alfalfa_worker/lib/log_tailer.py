@@ -0,0 +1,109 @@
+import codecs
+import os
+from pathlib import Path
+from time import monotonic
+
+
+class LogTailer:
+    """Follows the log files in a directory, reading only the bytes which were appended since they were last read.
+
+    Searching the directory for new log files is the only operation whose cost depends on the size of the
+    directory, so it is limited to once every discover_interval seconds unless it is requested explicitly."""
+
+    def __init__(self, directory: os.PathLike, pattern: str, discover_interval: float = 10) -> None:
+        """
+        Args:
+            directory (os.PathLike): Directory to search for log files.
+            pattern (str): Glob pattern of the log files, relative to directory.
+            discover_interval (float): Minimum seconds between searches for new log files.
+        """
+        self.directory = Path(directory)
+        self.pattern = pattern
+        self.discover_interval = discover_interval
+        self._last_discover = None
+        self._files: dict[Path, _TailedFile] = {}
+
+    def discover(self) -> None:
+        """Search the directory for log files which are not followed yet"""
+        self._last_discover = monotonic()
+        for path in self.directory.glob(self.pattern):
+            if path not in self._files:
+                self._files[path] = _TailedFile(path)
+
+    def update(self, discover: bool = False) -> None:
+        """Read the bytes appended to each log file.
+
+        Args:
+            discover (bool): Search for new log files even if discover_interval has not elapsed.
+        """
+        if discover or self._last_discover is None or monotonic() - self._last_discover >= self.discover_interval:
+            self.discover()
+        for tailed_file in self._files.values():
+            tailed_file.update()
+
+    def logs(self) -> dict[Path, str]:
+        """Get the contents of every log file as of the last update"""
+        return {path: tailed_file.text for path, tailed_file in self._files.items()}
+
+    def contains(self, text: str) -> bool:
+        """Check if any log file contains text as of the last update.
+        Only the part of each log which has not already been searched for text is searched."""
+        return any(tailed_file.contains(text) for tailed_file in self._files.values())
+
+
+class _TailedFile:
+    """Contents of a file which is read incrementally.
+    Text is kept as a list of the chunks read by each update so appending does not copy what was read before."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._chunks: list[str] = []
+        self._offset = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        # Number of chunks which have already been searched for each string
+        self._searched: dict[str, int] = {}
+        self._found: set[str] = set()
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._chunks)
+
+    def update(self) -> None:
+        try:
+            with self.path.open('rb') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                if size < self._offset:
+                    # The file was truncated or replaced, so start over
+                    self._chunks.clear()
+                    self._offset = 0
+                    self._decoder.reset()
+                    self._searched.clear()
+                    self._found.clear()
+                if size == self._offset:
+                    return
+                f.seek(self._offset)
+                data = f.read(size - self._offset)
+        except FileNotFoundError:
+            return
+        self._offset += len(data)
+        chunk = self._decoder.decode(data)
+        if chunk:
+            self._chunks.append(chunk)
+
+    def contains(self, text: str) -> bool:
+        if text in self._found:
+            return True
+        searched = self._searched.get(text, 0)
+        # Include the end of the searched chunks so a match which straddles them is found
+        overlap = ''
+        index = searched
+        while index > 0 and len(overlap) < len(text) - 1:
+            index -= 1
+            overlap = self._chunks[index] + overlap
+        overlap = overlap[max(0, len(overlap) - len(text) + 1):]
+        self._searched[text] = len(self._chunks)
+        if text in overlap + ''.join(self._chunks[searched:]):
+            self._found.add(text)
+            return True
+        return False
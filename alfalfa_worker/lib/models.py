@@ -433,6 +433,17 @@ class Point(TimestampedDocument):
         if self.point_type == PointType.OUTPUT:
             raise TypeError("Cannot read the value of a point with type OUTPUT")
         write_array = self.redis.lrange(self.redis_key + ':in', 0, -1)
+        return self.parse_write_array(write_array)
+
+    @value.setter
+    def value(self, value):
+        if self.point_type == PointType.INPUT:
+            raise TypeError("Cannot write to a point with type INTPUT")
+        self.redis.hset(self.redis_key + ':out', mapping=self.output_mapping(value))
+
+    @staticmethod
+    def parse_write_array(write_array: List[bytes]):
+        """Get the value of the highest priority entry in a point's write array"""
         value = None
         for entry in write_array:
             if len(entry) > 0:
@@ -440,18 +451,17 @@ class Point(TimestampedDocument):
                 if string_value == "null":
                     value = None
                 else:
-                    value = float(entry.decode('UTF-8'))
+                    value = float(string_value)
                 break
         return value
 
-    @value.setter
-    def value(self, value):
-        if self.point_type == PointType.INPUT:
-            raise TypeError("Cannot write to a point with type INTPUT")
-        self.redis.hset(self.redis_key + ':out', mapping={
+    @staticmethod
+    def output_mapping(value) -> dict:
+        """Get the redis hash fields which represent an output value"""
+        return {
             'curStatus': 's:ok',
             'curVal': f'n:{value}'
-        })
+        }
 
     @property
     def redis_key(self):
@@ -477,6 +487,11 @@ class Run(TimestampedDocument):
         connections_manager = AlafalfaConnectionsManager()
         self.redis = connections_manager.redis
 
+        # Registry of materialized input and output points.
+        # Populated on first access and invalidated when points are added to the run.
+        self._input_points = None
+        self._output_points = None
+
     def get_point_by_id(self, id) -> Point:
         return Point.objects.get(ref_id=id, run=self)
 
@@ -489,11 +504,27 @@ class Run(TimestampedDocument):
 
     @property
     def input_points(self) -> List[Point]:
-        return Point.objects(Q(point_type=PointType.INPUT) | Q(point_type=PointType.BIDIRECTIONAL), run=self)
+        if self._input_points is None:
+            self._input_points = self._materialize_points(Q(point_type=PointType.INPUT) | Q(point_type=PointType.BIDIRECTIONAL))
+        return self._input_points
 
     @property
     def output_points(self) -> List[Point]:
-        return Point.objects(Q(point_type=PointType.OUTPUT) | Q(point_type=PointType.BIDIRECTIONAL), run=self)
+        if self._output_points is None:
+            self._output_points = self._materialize_points(Q(point_type=PointType.OUTPUT) | Q(point_type=PointType.BIDIRECTIONAL))
+        return self._output_points
+
+    def _materialize_points(self, query: Q) -> List[Point]:
+        points = list(Point.objects(query, run=self))
+        # Attach this run directly so accessing point.run doesn't dereference it from the database
+        for point in points:
+            point.run = self
+        return points
+
+    def invalidate_points(self) -> None:
+        """Clear the registry of input and output points so they are queried again on next access"""
+        self._input_points = None
+        self._output_points = None
 
     @property
     def sim_time(self):
@@ -511,6 +542,19 @@ class Run(TimestampedDocument):
     def add_point(self, point: Point):
         point.run = self
         point.save()
+        self.invalidate_points()
+
+    def add_points(self, points: List[Point]):
+        """Add new points to the run with a single bulk insert.
+        The caller is responsible for making sure the ref_ids of the points are unique in the run."""
+        now = datetime.datetime.now()
+        for point in points:
+            point.run = self
+            point.modified = now
+            point.validate()
+        if len(points) > 0:
+            Point.objects.insert(points, load_bulk=False)
+        self.invalidate_points()
 
     # external ID used to track this object
     ref_id = StringField(default=uuid4_str, unique=True)
@@ -529,6 +573,9 @@ class Run(TimestampedDocument):
 
     error_log = StringField(default="")
 
+    # Key of the archive of the run in s3, set when the run is checked in
+    archive_key = StringField()
+
 
 class Simulation(TimestampedDocument):
     meta = {'collection': 'simulation'}
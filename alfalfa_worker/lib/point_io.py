@@ -0,0 +1,91 @@
+from ctypes import c_ulonglong
+from multiprocessing import RawValue
+from typing import Iterable
+
+from alfalfa_worker.lib.alfalfa_connections_manager import (
+    AlafalfaConnectionsManager
+)
+from alfalfa_worker.lib.enums import PointType
+from alfalfa_worker.lib.models import Point
+
+
+class PointIO:
+    """Batches the reading and writing of point values so that each phase of a
+    simulation step is a single redis round trip, instead of one per point.
+
+    The round trip counters live in shared memory so that counts made inside a
+    simulation subprocess can be read from the job process."""
+
+    def __init__(self) -> None:
+        connections_manager = AlafalfaConnectionsManager()
+        self.redis = connections_manager.redis
+
+        # Total number of round trips made to redis
+        self._round_trips = RawValue(c_ulonglong, 0)
+        # Number of round trips made to redis during the last completed step and the step in progress
+        self._last_step_round_trips = RawValue(c_ulonglong, 0)
+        self._current_step_round_trips = RawValue(c_ulonglong, 0)
+
+    @property
+    def round_trips(self) -> int:
+        return self._round_trips.value
+
+    @property
+    def last_step_round_trips(self) -> int:
+        """Number of round trips made during the last completed step, which ended at the most recent call to begin_step"""
+        return self._last_step_round_trips.value
+
+    def begin_step(self) -> None:
+        """Mark the start of a new simulation step for the per step round trip counter"""
+        self._last_step_round_trips.value = self._current_step_round_trips.value
+        self._current_step_round_trips.value = 0
+
+    def read_inputs(self, points: Iterable[Point]) -> list[float | None]:
+        """Read the values of a set of input points.
+
+        Args:
+            points (Iterable[Point]): Points of type INPUT or BIDIRECTIONAL.
+
+        Returns:
+            list[float | None]: Values of the points in the same order as they were given.
+            Points which are not attached to a run have a value of None.
+        """
+        points = list(points)
+        attached = [point for point in points if point.run is not None]
+        if len(attached) == 0:
+            return [None] * len(points)
+        pipeline = self.redis.pipeline(transaction=False)
+        for point in attached:
+            if point.point_type == PointType.OUTPUT:
+                raise TypeError("Cannot read the value of a point with type OUTPUT")
+            pipeline.lrange(point.redis_key + ':in', 0, -1)
+        write_arrays = iter(self._execute(pipeline))
+        return [Point.parse_write_array(next(write_arrays)) if point.run is not None else None for point in points]
+
+    def write_outputs(self, values: Iterable[tuple[Point, float]]) -> None:
+        """Write the values of a set of output points.
+
+        Args:
+            values (Iterable[tuple[Point, float]]): Pairs of points of type OUTPUT or BIDIRECTIONAL and their values.
+        """
+        pipeline = self.redis.pipeline(transaction=False)
+        for point, value in values:
+            if point.run is None:
+                continue
+            if point.point_type == PointType.INPUT:
+                raise TypeError("Cannot write to a point with type INTPUT")
+            pipeline.hset(point.redis_key + ':out', mapping=Point.output_mapping(value))
+        if len(pipeline) > 0:
+            self._execute(pipeline)
+
+    def stats(self) -> dict:
+        return {
+            'point_io_round_trips': self.round_trips,
+            'point_io_last_step_round_trips': self.last_step_round_trips
+        }
+
+    def _execute(self, pipeline) -> list:
+        result = pipeline.execute()
+        self._round_trips.value += 1
+        self._current_step_round_trips.value += 1
+        return result
@@ -1,17 +1,91 @@
+import os
+import sys
 from logging import Handler, LogRecord
 
+from redis import Redis
+
 from alfalfa_worker.lib.alfalfa_connections_manager import (
     AlafalfaConnectionsManager
 )
+from alfalfa_worker.lib.batch_writer import BatchWriter
 from alfalfa_worker.lib.models import Run
 
 
-class RedisLogHandler(Handler):
-    def __init__(self, run: Run, level: int | str = 0) -> None:
-        super().__init__(level)
-        connections_manager = AlafalfaConnectionsManager()
-        self.redis = connections_manager.redis
+class RedisLogHandler(BatchWriter, Handler):
+    """Appends log records to the log list of a run in redis from a background thread, so logging doesn't
+    add a redis round trip to the caller.
+
+    Records are queued by the BatchWriter base class and pushed in pipelined batches which also trim the
+    list to its maximum length. When the queue is full the oldest records are dropped."""
+
+    thread_name = "RedisLogHandler"
+
+    def __init__(self, run: Run, level: int | str = 0, redis: Redis = None,
+                 max_length: int = None, max_queue_size: int = None,
+                 batch_size: int = None, flush_interval: float = None) -> None:
+        """
+        Args:
+            run (Run): Run to write the log of.
+            level (int | str): Minimum level of records to write.
+            redis (Redis): Redis client. Defaults to the client of the AlafalfaConnectionsManager.
+            max_length (int): Maximum length of the log list in redis. Defaults to RUN_LOG_MAX_LENGTH or 10000.
+            max_queue_size (int): Maximum number of records held in the queue. Defaults to RUN_LOG_QUEUE_SIZE or 10000.
+            batch_size (int): Maximum number of records pushed at once. Defaults to RUN_LOG_BATCH_SIZE or 500.
+            flush_interval (float): Maximum seconds a record waits in the queue. Defaults to RUN_LOG_FLUSH_INTERVAL or 0.5.
+        """
+        Handler.__init__(self, level)
+        BatchWriter.__init__(
+            self,
+            max_queue_size if max_queue_size is not None else int(os.environ.get('RUN_LOG_QUEUE_SIZE', 10000)),
+            batch_size if batch_size is not None else int(os.environ.get('RUN_LOG_BATCH_SIZE', 500)),
+            flush_interval if flush_interval is not None else float(os.environ.get('RUN_LOG_FLUSH_INTERVAL', 0.5)))
+        self.redis = redis if redis is not None else AlafalfaConnectionsManager().redis
         self.run = run
 
+        self.max_length = max_length if max_length is not None else int(os.environ.get('RUN_LOG_MAX_LENGTH', 10000))
+        if self.max_length < 1:
+            raise ValueError(f"Run log max length must be at least 1, got {self.max_length}")
+
+    @property
+    def key(self) -> str:
+        return f"run:{self.run.ref_id}:log"
+
     def emit(self, record: LogRecord) -> None:
-        self.redis.rpush(f"run:{self.run.ref_id}:log", self.format(record))
+        try:
+            entry = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        self.put([entry])
+
+    def flush(self, timeout: float = 5) -> bool:
+        """Wait for all queued records to be written.
+
+        Returns:
+            bool: True if the queue was emptied before the timeout.
+        """
+        return BatchWriter.flush(self, timeout)
+
+    def close(self, timeout: float = 5) -> None:
+        """Write all queued records and stop the background thread"""
+        BatchWriter.close(self, timeout)
+        Handler.close(self)
+
+    def stats(self) -> dict:
+        return {
+            'log_dropped': self._dropped.value,
+            'log_written': self._written.value,
+            'log_failed': self._failed.value
+        }
+
+    def _write(self, batch: list[str]) -> bool:
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            pipeline.rpush(self.key, *batch)
+            pipeline.ltrim(self.key, -self.max_length, -1)
+            pipeline.execute()
+        except Exception as e:
+            # Logging the error could recurse into this handler
+            print(f"Redis error writing {len(batch)} log records: {e}", file=sys.stderr)
+            return False
+        return True
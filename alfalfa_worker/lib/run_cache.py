@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+
+
+class RunCache:
+    """Keeps the directories of checked in runs on the local disk so they can be checked out again
+    without downloading the archive from s3.
+
+    Entries are identified by the ETag of the archive uploaded for the run. An entry is only reused
+    when the ETag of the archive currently in s3 matches, so a run which was checked in by a different
+    worker is downloaded again. The least recently checked in runs are evicted once the total size
+    of the cache exceeds its budget.
+
+    Each entry is a directory with the run contents and a json file of metadata. Entries are claimed by
+    renaming their directory, so multiple processes can share a cache."""
+
+    def __init__(self, cache_dir: os.PathLike, max_size: int) -> None:
+        """
+        Args:
+            cache_dir (os.PathLike): Directory to store cached runs in.
+            max_size (int): Disk budget of the cache in bytes.
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+
+    def put(self, run_id: str, run_path: Path, etag: str) -> None:
+        """Move a run directory into the cache, replacing any existing entry for the run.
+
+        Args:
+            run_id (str): ID of the run.
+            run_path (Path): Directory of the run.
+            etag (str): ETag of the archive of the run in s3.
+        """
+        self.remove(run_id)
+        size = sum(file.stat().st_size for file in run_path.rglob('*') if file.is_file())
+        run_path.rename(self._entry_path(run_id))
+        self._write_metadata(run_id, {'etag': etag, 'size': size, 'last_used': time.time()})
+        self.evict()
+
+    def take(self, run_id: str, etag: str, run_path: Path) -> bool:
+        """Move a cached run to run_path if the cached entry matches the ETag of the archive.
+
+        Returns:
+            bool: True if the run was restored from the cache.
+        """
+        metadata = self._read_metadata(run_id)
+        if metadata is None:
+            return False
+        if etag is None or metadata['etag'] != etag:
+            self.logger.info(f"Cached run {run_id} is out of date")
+            self.remove(run_id)
+            return False
+        try:
+            self._entry_path(run_id).rename(run_path)
+        except OSError:
+            # Another process claimed or evicted the entry first
+            return False
+        self._metadata_path(run_id).unlink(missing_ok=True)
+        self.logger.info(f"Restored run {run_id} from cache")
+        return True
+
+    def remove(self, run_id: str) -> None:
+        self._metadata_path(run_id).unlink(missing_ok=True)
+        shutil.rmtree(self._entry_path(run_id), ignore_errors=True)
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache is within its budget"""
+        entries = []
+        for metadata_path in self.cache_dir.glob('*.json'):
+            run_id = metadata_path.stem
+            metadata = self._read_metadata(run_id)
+            if metadata is not None:
+                entries.append((metadata['last_used'], metadata['size'], run_id))
+        entries.sort()
+        total_size = sum(size for _, size, _ in entries)
+        while total_size > self.max_size and len(entries) > 0:
+            _, size, run_id = entries.pop(0)
+            self.logger.info(f"Evicting run {run_id} from cache")
+            self.remove(run_id)
+            total_size -= size
+
+    def _entry_path(self, run_id: str) -> Path:
+        return self.cache_dir / run_id
+
+    def _metadata_path(self, run_id: str) -> Path:
+        return self.cache_dir / f"{run_id}.json"
+
+    def _read_metadata(self, run_id: str) -> dict:
+        try:
+            return json.loads(self._metadata_path(run_id).read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _write_metadata(self, run_id: str, metadata: dict) -> None:
+        tmp_path = self._metadata_path(run_id).with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(metadata))
+        tmp_path.replace(self._metadata_path(run_id))
@@ -1,19 +1,33 @@
 import os
 import shutil
-import tarfile
 import tempfile
+import threading
+import time
 import zipfile
+from contextlib import contextmanager
 from pathlib import Path
+from typing import BinaryIO, Callable, Iterator
 from uuid import uuid4
 
-import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
 
 from alfalfa_worker.lib.alfalfa_connections_manager import (
     AlafalfaConnectionsManager
 )
+from alfalfa_worker.lib.archive import (
+    ArchiveFormat,
+    open_archive,
+    write_archive
+)
 from alfalfa_worker.lib.enums import SimType
 from alfalfa_worker.lib.logger_mixins import LoggerMixinBase
 from alfalfa_worker.lib.models import Model, Run, Site
+from alfalfa_worker.lib.run_cache import RunCache
+
+# States of a run in redis while it is checked in asynchronously
+UPLOAD_PENDING = 'pending'
+UPLOAD_FAILED = 'failed'
 
 
 class RunManager(LoggerMixinBase):
@@ -36,13 +50,63 @@ class RunManager(LoggerMixinBase):
         if not Path.exists(self.tmp_dir):
             self.tmp_dir.mkdir()
 
+        # Keep checked in runs on disk when RUN_CACHE_SIZE (in MB) is set
+        cache_size = int(os.environ.get('RUN_CACHE_SIZE', 0))
+        self.run_cache = RunCache(self.run_dir / 'cache', cache_size * 1024 * 1024) if cache_size > 0 else None
+        # Upload runs to s3 in the background when RUN_CHECKIN_ASYNC is set
+        self.checkin_async = os.environ.get('RUN_CHECKIN_ASYNC', 'false').lower() == 'true'
+        self.checkin_timeout = int(os.environ.get('RUN_CHECKIN_TIMEOUT', 600))
+        # Seconds before the pending state of an upload expires unless it is refreshed by the uploading worker,
+        # so a worker which dies while uploading doesn't block checkouts of the run
+        self.upload_heartbeat = int(os.environ.get('RUN_UPLOAD_HEARTBEAT', 30))
+        # Seconds the failed state of an upload is kept for, to let the worker with the staged run restore it
+        self.upload_failed_ttl = int(os.environ.get('RUN_UPLOAD_FAILED_TTL', 24 * 3600))
+        self.uploads: dict[str, threading.Thread] = {}
+
+        # Read once so an invalid RUN_ARCHIVE_FORMAT fails at startup instead of at checkin
+        self.archive_format = ArchiveFormat.from_env()
+
+        # Part size (in MB) and number of threads used for multipart transfers
+        self.transfer_config = TransferConfig(
+            multipart_chunksize=int(os.environ.get('S3_MULTIPART_CHUNKSIZE', 8)) * 1024 * 1024,
+            max_concurrency=int(os.environ.get('S3_MAX_CONCURRENCY', 10)))
+
     def s3_download(self, key: str, file_path: os.PathLike):
         """Download a file from s3"""
-        self.s3_bucket.download_file(key, str(file_path))
+        self.s3_bucket.download_file(key, str(file_path), Config=self.transfer_config)
 
     def s3_upload(self, file_path: os.PathLike, key: str):
         """Upload a file to s3"""
-        self.s3_bucket.upload_file(str(file_path), key)
+        self.s3_bucket.upload_file(str(file_path), key, Config=self.transfer_config)
+
+    def s3_download_stream(self, key: str) -> BinaryIO:
+        """Open a file in s3 as a stream"""
+        return self.s3_bucket.Object(key).get()['Body']
+
+    def s3_upload_stream(self, write: Callable[[BinaryIO], None], key: str):
+        """Upload a file to s3 as it is written, without storing it on disk.
+
+        Args:
+            write (Callable[[BinaryIO], None]): Function which writes the contents of the file to a stream.
+            key (str): Key to upload the file to.
+        """
+        read_fd, write_fd = os.pipe()
+        writer = _PipeWriter(write, write_fd)
+        writer.start()
+        try:
+            with os.fdopen(read_fd, 'rb') as pipe:
+                self.s3_bucket.upload_fileobj(_PipeReader(pipe, writer), key, Config=self.transfer_config)
+        finally:
+            writer.join()
+        if writer.error is not None:
+            raise writer.error
+
+    def s3_etag(self, key: str) -> str:
+        """Get the ETag of a file in s3, or None if it does not exist"""
+        try:
+            return self.s3_bucket.Object(key).e_tag
+        except ClientError:
+            return None
 
     def create_model(self, file_path: os.PathLike) -> Model:
         file_path = Path(file_path)
@@ -98,53 +162,158 @@ class RunManager(LoggerMixinBase):
 
     def checkin_run(self, run: Run) -> tuple[bool, str]:
         """Upload Run to s3 and delete local files"""
-
+        upload_location = "run/%s%s" % (run.ref_id, self.archive_format.extension)
+        run.archive_key = upload_location
         run.save()
 
-        def reset(tarinfo):
-            tarinfo.uid = tarinfo.gid = 0
-            tarinfo.uname = tarinfo.gname = "root"
-
-            return tarinfo
-
         self.logger.info(f"Checking in run with ID {run.ref_id}")
         # Add an instance of this into the database regardless if
         # it is there or not. This is because the checkin code
         # is called when there are failures, etc., and it breaks
         # the front end when it tries to find the objects.
         Site(ref_id=run.ref_id)
-        tarname = "%s.tar.gz" % run.ref_id
-        tar_path = self.tmp_dir / tarname
-        tar = tarfile.open(tar_path, "w:gz")
-        tar.add(run.dir, filter=reset, arcname=run.ref_id)
-        tar.close()
+        run_path = Path(run.dir)
+        # Forget a failed upload of a previous checkin, this checkin replaces it
+        self.redis.delete(self._upload_key(run.ref_id))
 
-        upload_location = "run/%s" % tarname
-        try:
-            self.logger.info(f"uploading {tarname} to {upload_location}")
-            self.s3_upload(tar_path, upload_location)
-            os.remove(tar_path)
-            shutil.rmtree(run.dir)
+        if self.checkin_async:
+            # Move the run out of the way so the directory can't change while it is uploaded
+            staging_path = self.tmp_dir / run.ref_id
+            if staging_path.exists():
+                shutil.rmtree(staging_path)
+            run_path.rename(staging_path)
+            self._set_upload_state(run.ref_id, UPLOAD_PENDING, ex=self.upload_heartbeat)
+            upload = threading.Thread(target=self._upload_run, args=(run.ref_id, staging_path, upload_location),
+                                      name=f"Upload {run.ref_id}")
+            self.uploads[run.ref_id] = upload
+            upload.start()
             return True, upload_location
-        except boto3.exceptions.S3UploadFailedError as e:
-            return False, e
-        except FileNotFoundError as e:
+        return self._upload_run(run.ref_id, run_path, upload_location)
+
+    def _upload_run(self, run_id: str, run_path: Path, upload_location: str) -> tuple[bool, str]:
+        """Upload a run directory to s3 as a tar archive and then remove or cache the directory.
+
+        When checking in asynchronously the pending state of the run in redis is refreshed while it uploads.
+        A failed upload marks the run as failed and keeps the staged directory, so the next checkout restores
+        it instead of downloading a stale archive."""
+        def reset(tarinfo):
+            tarinfo.uid = tarinfo.gid = 0
+            tarinfo.uname = tarinfo.gname = "root"
+
+            return tarinfo
+
+        try:
+            with self._upload_heartbeat(run_id):
+                self.logger.info(f"uploading {run_path} to {upload_location} as {self.archive_format.value.lower()}")
+                self.s3_upload_stream(lambda file: write_archive(file, run_path, run_id, self.archive_format, filter=reset),
+                                      upload_location)
+        except Exception as e:
+            self.logger.error(f"Failed to upload run {run_id}: {e}")
+            if self.checkin_async:
+                self._set_upload_state(run_id, UPLOAD_FAILED, ex=self.upload_failed_ttl)
+                self._forget_upload(run_id)
             return False, e
 
+        try:
+            if self.run_cache is not None:
+                self.run_cache.put(run_id, run_path, self.s3_etag(upload_location))
+            else:
+                shutil.rmtree(run_path)
+        except Exception as e:
+            # The archive is complete, so the run can still be checked out from s3
+            self.logger.error(f"Failed to remove run {run_id} after uploading it: {e}")
+        finally:
+            if self.checkin_async:
+                self.redis.delete(self._upload_key(run_id))
+                self._forget_upload(run_id)
+        return True, upload_location
+
+    @contextmanager
+    def _upload_heartbeat(self, run_id: str) -> Iterator[None]:
+        """Keep the pending state of an asynchronous upload from expiring while it runs"""
+        if not self.checkin_async:
+            yield
+            return
+        uploaded = threading.Event()
+
+        def refresh():
+            while not uploaded.wait(self.upload_heartbeat / 3):
+                self.redis.expire(self._upload_key(run_id), self.upload_heartbeat)
+
+        heartbeat = threading.Thread(target=refresh, name=f"Upload heartbeat {run_id}", daemon=True)
+        heartbeat.start()
+        try:
+            yield
+        finally:
+            uploaded.set()
+            heartbeat.join()
+
+    def _forget_upload(self, run_id: str) -> None:
+        """Called from an upload thread when it is done, so finished threads are not kept"""
+        if self.uploads.get(run_id) is threading.current_thread():
+            del self.uploads[run_id]
+
+    def wait_for_uploads(self, timeout: float = None) -> None:
+        """Wait for runs which are being checked in asynchronously to finish uploading"""
+        for run_id, upload in list(self.uploads.items()):
+            upload.join(timeout)
+            if not upload.is_alive():
+                self.uploads.pop(run_id, None)
+
+    def _wait_for_upload(self, run_id: str) -> bool:
+        """Wait for a run which is being uploaded by this or another worker.
+
+        Returns:
+            bool: True if the upload failed and the run was restored from its staged directory.
+        """
+        upload = self.uploads.pop(run_id, None)
+        if upload is not None:
+            upload.join()
+        deadline = time.monotonic() + self.checkin_timeout
+        while (state := self._get_upload_state(run_id)) == UPLOAD_PENDING:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for run {run_id} to be uploaded")
+            time.sleep(0.5)
+
+        if state != UPLOAD_FAILED:
+            return False
+        staging_path = self.tmp_dir / run_id
+        if not staging_path.exists():
+            # The failed state expires after upload_failed_ttl, after which the last uploaded archive is used
+            raise RuntimeError(f"Upload of run {run_id} failed on another worker")
+        self.logger.info(f"restoring {run_id} from {staging_path} after its upload failed")
+        run_path = self.run_dir / run_id
+        if run_path.exists():
+            shutil.rmtree(run_path)
+        staging_path.rename(run_path)
+        self.redis.delete(self._upload_key(run_id))
+        return True
+
+    @staticmethod
+    def _upload_key(run_id: str) -> str:
+        return f"run:{run_id}:upload"
+
+    def _set_upload_state(self, run_id: str, state: str, ex: int = None) -> None:
+        self.redis.set(self._upload_key(run_id), state, ex=ex)
+
+    def _get_upload_state(self, run_id: str) -> str:
+        state = self.redis.get(self._upload_key(run_id))
+        return state.decode('UTF-8') if state is not None else None
+
     def checkout_run(self, run_id: str) -> Run:
         """Download Run contents and create Run object"""
-        tar_file_path = self.tmp_dir / f"{run_id}.tar.gz"
         run_path = self.run_dir / run_id
-        key = f'run/{run_id}.tar.gz'
-        self.logger.info(f"downloading {tar_file_path} from {key}")
-        self.s3_download(key, tar_file_path)
+        restored = self._wait_for_upload(run_id)
+        run = Run.objects.get(ref_id=run_id)
+        # Runs checked in before the archive key was stored are always gzipped tar archives
+        key = run.archive_key or f'run/{run_id}.tar.gz'
 
-        tar = tarfile.open(tar_file_path)
-        tar.extractall(self.run_dir)
-        tar.close()
-        os.remove(tar_file_path)
+        if not restored and (self.run_cache is None or not self.run_cache.take(run_id, self.s3_etag(key), run_path)):
+            self.logger.info(f"downloading {run_id} from {key}")
+            with self.s3_download_stream(key) as body:
+                with open_archive(body) as tar:
+                    tar.extractall(self.run_dir)
 
-        run = Run.objects.get(ref_id=run_id)
         run.dir = run_path
         return run
 
@@ -162,3 +331,41 @@ class RunManager(LoggerMixinBase):
             self.s3_upload(model_path, str(upload_path))
 
         return upload_id, upload_path.name
+
+
+class _PipeWriter(threading.Thread):
+    """Thread which writes a file into a pipe for s3_upload_stream"""
+
+    def __init__(self, write: Callable[[BinaryIO], None], fd: int) -> None:
+        super().__init__(name="PipeWriter", daemon=True)
+        self.write = write
+        self.fd = fd
+        self.error: Exception = None
+
+    def run(self) -> None:
+        pipe = os.fdopen(self.fd, 'wb')
+        try:
+            self.write(pipe)
+        except Exception as e:
+            self.error = e
+        finally:
+            # Closing the pipe signals the end of the file to the reader
+            try:
+                pipe.close()
+            except BrokenPipeError:
+                pass
+
+
+class _PipeReader:
+    """Reads a pipe filled by a _PipeWriter, raising instead of ending the file early
+    if the writer failed so that an incomplete file is never uploaded"""
+
+    def __init__(self, pipe: BinaryIO, writer: _PipeWriter) -> None:
+        self.pipe = pipe
+        self.writer = writer
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.pipe.read(size)
+        if len(data) == 0 and self.writer.error is not None:
+            raise self.writer.error
+        return data
@@ -24,13 +24,15 @@ information, and calculating and reporting results.
 
 """
 
-import copy
+import os
 
 import numpy as np
 from pyfmi import load_fmu
-from scipy.integrate import trapezoid
+from pyfmi.fmi import FMUModelCS2
 
 from alfalfa_worker.lib.data.data_manager import Data_Manager
+from alfalfa_worker.lib.kpi_accumulator import KPIAccumulator
+from alfalfa_worker.lib.trajectory_store import TrajectoryStore
 
 
 class TestCase(object):
@@ -53,7 +55,8 @@ class TestCase(object):
 
         # default the remaining kwarg arguments
         init_options = {
-            'start_time': 0
+            'start_time': 0,
+            'do_step': os.environ.get('BOPTEST_DO_STEP', 'false').lower() == 'true'
         }
         init_options.update(kwargs)
 
@@ -66,8 +69,11 @@ class TestCase(object):
         if self.fmu_version != '2.0':
             raise ValueError('FMU must be version 2.0.')
         # Load data and the kpis_json for the test case
-        data_manager = Data_Manager(testcase=self)
-        data_manager.load_data_and_kpisjson()
+        self.data_manager = Data_Manager(testcase=self)
+        self.data_manager.load_data_and_kpisjson()
+        # Integrate the KPI signals as the simulation advances
+        self.heat_setpoint = 273.15 + 20
+        self.kpi_accumulator = KPIAccumulator(self._get_kpi_signals())
         # Get available control inputs and outputs
         input_names = self.fmu.get_model_variables(causality=2).keys()
         output_names = self.fmu.get_model_variables(causality=3).keys()
@@ -78,14 +84,18 @@ class TestCase(object):
         self.y = {'time': []}
         for key in output_names:
             self.y[key] = []
-        self.y_store = copy.deepcopy(self.y)
+        self.y_store = TrajectoryStore(self.y.keys())
         # Define inputs data
         self.u = {'time': []}
         for key in input_names:
             self.u[key] = []
-        self.u_store = copy.deepcopy(self.u)
+        self.u_store = TrajectoryStore(self.u.keys())
+        # Co-simulation FMUs can be stepped with do_step when do_step is enabled,
+        # otherwise each step is simulated with the results kept in memory
+        self.stepping = bool(init_options['do_step']) and isinstance(self.fmu, FMUModelCS2)
         # Set default options
         self.options = self.fmu.simulate_options()
+        self.options['result_handling'] = 'memory'
         # self.options['CVode_options']['rtol'] = 1e-6
         # Set default communication step
         self.set_step(init_options['step'])
@@ -114,33 +124,88 @@ class TestCase(object):
         # Set final time
         self.final_time = self.start_time + self.step
         # Set control inputs if they exist and are written
-        # Check if possible to overwrite
-        if u.keys():
-            # If there are overwriting keys available
-            # Check that any are overwritten
-            written = False
-            for key in u.keys():
-                if u[key]:
-                    written = True
-                    break
-            # If there are, create input object
-            if written:
-                u_list = []
-                u_trajectory = self.start_time
-                for key in u.keys():
-                    if key != 'time' and u[key]:
-                        value = float(u[key])
-                        # Check min/max if not activation input
-                        if '_activate' not in key:
-                            checked_value = self._check_value_min_max(key, value)
-                        else:
-                            checked_value = value
-                        u_list.append(key)
-                        u_trajectory = np.vstack((u_trajectory, checked_value))
-                input_object = (u_list, np.transpose(u_trajectory))
-            # Otherwise, input object is None
-            else:
-                input_object = None
+        u_list, u_values = self._get_written_inputs(u)
+        if self.stepping:
+            self._step(u_list, u_values)
+        else:
+            self._simulate(u_list, u_values)
+        # Advance start time
+        self.start_time = self.final_time
+        # Prevent initialize
+        self.initialize = False
+
+        return self.y
+
+    def _get_written_inputs(self, u):
+        '''Get the control inputs which are written, checked against their min and max.
+
+        Parameters
+        ----------
+        u : dict
+            Defines the control input data to be used for the step.
+            {<input_name> : <input_value>}
+
+        Returns
+        -------
+        u_list : list of str
+            Names of the written inputs.
+        u_values : list of float
+            Values of the written inputs.
+
+        '''
+
+        u_list = []
+        u_values = []
+        for key in u.keys():
+            if key != 'time' and u[key]:
+                value = float(u[key])
+                # Check min/max if not activation input
+                if '_activate' not in key:
+                    checked_value = self._check_value_min_max(key, value)
+                else:
+                    checked_value = value
+                u_list.append(key)
+                u_values.append(checked_value)
+
+        return u_list, u_values
+
+    def _step(self, u_list, u_values):
+        '''Advance a co-simulation FMU by one step, initializing it on the first step.
+
+        The FMU is kept in step mode between advances so that each advance is
+        a single do_step call.
+
+        '''
+
+        if self.initialize:
+            self.fmu.setup_experiment(start_time=self.start_time)
+            self.fmu.enter_initialization_mode()
+            self.fmu.exit_initialization_mode()
+            self.y_keys = [key for key in self.y.keys() if key != 'time']
+            self.u_keys = [key for key in self.u.keys() if key != 'time']
+        if u_list:
+            self.fmu.set(u_list, u_values)
+        status = self.fmu.do_step(current_t=self.start_time, step_size=self.step, new_step=True)
+        if status != 0:
+            raise RuntimeError('FMU step from {0} to {1} failed with status {2}.'.format(self.start_time, self.final_time, status))
+        # Get result and store measurement
+        self.y.update(zip(self.y_keys, self.fmu.get(self.y_keys)))
+        self.y['time'] = self.final_time
+        y_step = {key: [value] for key, value in self.y.items()}
+        self.y_store.append(y_step)
+        self.kpi_accumulator.update(y_step['time'], self._get_kpi_values(y_step))
+        # Store control inputs
+        u_values = dict(zip(self.u_keys, self.fmu.get(self.u_keys)))
+        u_values['time'] = self.final_time
+        self.u_store.append({key: [value] for key, value in u_values.items()})
+
+    def _simulate(self, u_list, u_values):
+        '''Simulate the FMU over one step.'''
+
+        # If inputs are written, create input object
+        if u_list:
+            u_trajectory = np.array([[self.start_time] + u_values])
+            input_object = (u_list, u_trajectory)
         # Otherwise, input object is None
         else:
             input_object = None
@@ -153,16 +218,11 @@ class TestCase(object):
         # Get result and store measurement
         for key in self.y.keys():
             self.y[key] = res[key][-1]
-            self.y_store[key] = self.y_store[key] + res[key].tolist()[1:]
+        y_step = {key: res[key][1:] for key in self.y_store.keys()}
+        self.y_store.append(y_step)
+        self.kpi_accumulator.update(y_step['time'], self._get_kpi_values(y_step))
         # Store control inputs
-        for key in self.u.keys():
-            self.u_store[key] = self.u_store[key] + res[key].tolist()[1:]
-        # Advance start time
-        self.start_time = self.final_time
-        # Prevent initialize
-        self.initialize = False
-
-        return self.y
+        self.u_store.append({key: res[key][1:] for key in self.u_store.keys()})
 
     def reset(self):
         '''Reset the test.
@@ -241,14 +301,15 @@ class TestCase(object):
         -------
         Y : dict
             Dictionary of measurement and control input names and their
-            trajectories as lists.
+            trajectories as numpy arrays. The arrays are views of the
+            stored trajectories and should not be modified.
             {'y':{<measurement_name>:<measurement_trajectory>},
              'u':{<input_name>:<input_trajectory>}
             }
 
         '''
 
-        Y = {'y': self.y_store, 'u': self.u_store}
+        Y = {'y': self.y_store.to_dict(), 'u': self.u_store.to_dict()}
 
         return Y
 
@@ -269,27 +330,20 @@ class TestCase(object):
         '''
 
         kpis = dict()
-        # Calculate each KPI using json for signals and save in dictionary
+        # Calculate each KPI from the integrals of its signals and save in dictionary
         for kpi in self.kpi_json.keys():
-            print(kpi, type(kpi))
             if 'Power' in kpi:
                 # Calculate total energy [KWh - assumes measured in J]
                 E = 0
                 for signal in self.kpi_json[kpi]:
-                    time = self.y_store['time']
-                    power = self.y_store[signal]
-                    E = E + np.trapz(power, time)
+                    E = E + self.kpi_accumulator.integral(signal)
                 # Store result in dictionary
                 kpis['energy'] = E * 2.77778e-7  # Convert to kWh
             elif kpi == 'AirZoneTemperature':
                 # Calculate total discomfort [K-h = assumes measured in K]
                 tot_dis = 0
-                heat_setpoint = 273.15 + 20
                 for signal in self.kpi_json[kpi]:
-                    data = np.array(self.y_store[signal])
-                    dT_heating = heat_setpoint - data
-                    dT_heating[dT_heating < 0] = 0
-                    tot_dis = tot_dis + trapezoid(dT_heating, self.y_store['time']) / 3600
+                    tot_dis = tot_dis + self.kpi_accumulator.integral(signal + '_discomfort') / 3600
                 # Store result in dictionary
                 kpis['comfort'] = tot_dis
             else:
@@ -297,6 +351,47 @@ class TestCase(object):
 
         return kpis
 
+    def _get_kpi_signals(self):
+        '''Returns the names of the signals integrated for the KPIs.'''
+
+        signals = []
+        for kpi in self.kpi_json.keys():
+            if 'Power' in kpi:
+                signals.extend(self.kpi_json[kpi])
+            elif kpi == 'AirZoneTemperature':
+                signals.extend(signal + '_discomfort' for signal in self.kpi_json[kpi])
+
+        return list(dict.fromkeys(signals))
+
+    def _get_kpi_values(self, y):
+        '''Returns the values of the signals integrated for the KPIs.
+
+        Parameters
+        ----------
+        y : dict
+            Measurement trajectories of the last step.
+            {<measurement_name>:<measurement_trajectory>}
+
+        Returns
+        -------
+        values : dict
+            Trajectories of the KPI signals over the last step.
+
+        '''
+
+        values = dict()
+        for kpi in self.kpi_json.keys():
+            if 'Power' in kpi:
+                for signal in self.kpi_json[kpi]:
+                    values[signal] = y[signal]
+            elif kpi == 'AirZoneTemperature':
+                # Discomfort is the temperature below the heating setpoint
+                for signal in self.kpi_json[kpi]:
+                    dT_heating = self.heat_setpoint - np.asarray(y[signal], dtype=float)
+                    values[signal + '_discomfort'] = np.maximum(dT_heating, 0)
+
+        return values
+
     def get_name(self):
         '''Returns the name of the test case fmu.
 
@@ -2,7 +2,7 @@
 # This class calculates the predicted mean vote and percent people dissatisfied based on the methodology in
 # ASHRAE Standard 55 Normative Appendix B and in accordance with ISO 7730.
 
-import math
+import numpy as np
 
 
 class ThermalComfort(object):
@@ -21,8 +21,33 @@ class ThermalComfort(object):
         :param wme: float, external work (met), defaults to 0
         :return: list, [PMV, PPD]
         """
+        # The calculation is shared with pmv_ppd_array so both give identical results
+        pmv, ppd = cls.pmv_ppd_array(ta, tr, met, clo, vel, rh, wme)
+        return [float(pmv), float(ppd)]
+
+    @classmethod
+    def pmv_ppd_array(cls, ta, tr, met, clo, vel, rh, wme=0):
+        """
+        Vectorized version of pmv_ppd for arrays of conditions, such as many zones over many timesteps.
+        Arguments are broadcast against each other and each element is iterated until it converges on its own,
+        so every element is identical to the result of pmv_ppd for the same conditions.
+
+        :param ta: array_like, Air Temperature (C)
+        :param tr: array_like, mean radiant temperature (C)
+        :param met: array_like, metabolic rate (met)
+        :param clo: array_like, clothing (clo)
+        :param vel: array_like, relative air velocity (m/s)
+        :param rh: array_like, percent relative humidity (%)
+        :param wme: array_like, external work (met), defaults to 0
+        :return: tuple, (PMV, PPD) arrays
+        """
+        arrays = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (ta, tr, met, clo, vel, rh, wme)))
+        shape = arrays[0].shape
+        # Work on flat arrays so that the elements which are still iterating can be indexed
+        ta, tr, met, clo, vel, rh, wme = (array.ravel() for array in arrays)
+
         # water vapor pressure (Pascals)
-        pa = rh * 10 * math.exp(16.6536 - 4030.183 / (ta + 235))
+        pa = rh * 10 * np.exp(16.6536 - 4030.183 / (ta + 235))
 
         # thermal insulation of the clothing in m2K/W
         icl = 0.155 * clo
@@ -37,17 +62,16 @@ class ThermalComfort(object):
         mw = m - w
 
         # clothing area factor
-        fcl = 1 + 1.29 * icl if icl < 0.078 else 1.05 + 0.645 * icl
+        fcl = np.where(icl < 0.078, 1 + 1.29 * icl, 1.05 + 0.645 * icl)
 
         # heat transfer coefficient by forced convection
-        hcf = 12.1 * math.sqrt(vel)
+        hcf = 12.1 * np.sqrt(vel)
 
         # air temperatures in Kelvin
         taa = ta + 273
         tra = tr + 273
 
         # Calculate surface temperature of clothing by iteration
-        # tcl = f(taa, ...)
         tcla = taa + (35.5 - ta) / (3.5 * (6.45 * icl + 0.1))
         p1 = icl * fcl
         p2 = p1 * 3.96
@@ -57,18 +81,32 @@ class ThermalComfort(object):
         xn = tcla / 100
         # initial guess for xf is xn / 2
         xf = xn / 2
+        hc = np.zeros_like(xn)
         n = 0
         eps = 0.00015
 
-        while abs(xn - xf) > eps:
+        # Iterate compacted arrays of the elements which have not converged yet,
+        # storing the results of each element once it converges
+        active = np.flatnonzero(np.abs(xn - xf) > eps)
+        xf_a, xn_a, taa_a, hcf_a = xf[active], xn[active], taa[active], hcf[active]
+        p2_a, p3_a, p4_a, p5_a = p2[active], p3[active], p4[active], p5[active]
+        while active.size > 0:
             n += 1
-            xf = (xf + xn) / 2
-            hcn = 2.38 * abs(100 * xf - taa) ** 0.25
-            hc = hcf if hcf > hcn else hcn
-            xn = (p5 + p4 * hc - p2 * xf ** 4) / (100 + p3 * hc)
+            xf_a = (xf_a + xn_a) / 2
+            hcn = 2.38 * np.abs(100 * xf_a - taa_a) ** 0.25
+            hc_a = np.where(hcf_a > hcn, hcf_a, hcn)
+            xn_a = (p5_a + p4_a * hc_a - p2_a * xf_a ** 4) / (100 + p3_a * hc_a)
 
             if n > 150:
                 raise Exception('Unable to converge on clothing surface temperature')
+            converged = np.abs(xn_a - xf_a) <= eps
+            if converged.any():
+                xn[active[converged]] = xn_a[converged]
+                hc[active[converged]] = hc_a[converged]
+                remaining = ~converged
+                active = active[remaining]
+                xf_a, xn_a, taa_a, hcf_a = xf_a[remaining], xn_a[remaining], taa_a[remaining], hcf_a[remaining]
+                p2_a, p3_a, p4_a, p5_a = p2_a[remaining], p3_a[remaining], p4_a[remaining], p5_a[remaining]
 
         # final surface temperature of clothing
         tcl = 100 * xn - 273
@@ -77,7 +115,7 @@ class ThermalComfort(object):
         # skin
         hl1 = 3.05 * 0.001 * (5733 - (6.99 * mw) - pa)
         # sweating
-        hl2 = 0.42 * (mw - 58.15) if mw > 58.15 else 0
+        hl2 = np.where(mw > 58.15, 0.42 * (mw - 58.15), 0)
         # latent respiration heat loss
         hl3 = 1.7 * 0.00001 * m * (5867 - pa)
         # dry respiration heat loss
@@ -88,7 +126,7 @@ class ThermalComfort(object):
         hl6 = fcl * hc * (tcl - ta)
 
         # calculate PMV
-        ts = 0.303 * math.exp(-0.036 * m) + 0.028
+        ts = 0.303 * np.exp(-0.036 * m) + 0.028
         pmv = ts * (mw - hl1 - hl2 - hl3 - hl4 - hl5 - hl6)
-        ppd = 100 - 95 * math.exp(-0.03353 * pmv ** 4 - 0.2179 * pmv ** 2)
-        return [pmv, ppd]
+        ppd = 100 - 95 * np.exp(-0.03353 * pmv ** 4 - 0.2179 * pmv ** 2)
+        return pmv.reshape(shape), ppd.reshape(shape)
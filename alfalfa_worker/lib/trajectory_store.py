@@ -0,0 +1,60 @@
+from typing import Iterable, Mapping, Sequence
+
+import numpy as np
+
+
+class TrajectoryStore:
+    """Stores the trajectories of a fixed set of variables in preallocated float64 columns.
+
+    Capacity is doubled when the columns are full, so appending a step costs amortized
+    constant time regardless of how long the simulation has run. Trajectories are
+    returned as views of the columns without copying."""
+
+    def __init__(self, keys: Iterable[str], capacity: int = 1024) -> None:
+        """
+        Args:
+            keys (Iterable[str]): Names of the variables to store.
+            capacity (int): Number of values per variable to allocate initially.
+        """
+        self._keys = list(keys)
+        self._columns = {key: column for column, key in enumerate(self._keys)}
+        self._data = np.empty((len(self._keys), capacity), dtype=np.float64)
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._columns
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self._data[self._columns[key], :self._length]
+
+    def keys(self) -> list[str]:
+        return self._keys
+
+    def append(self, values: Mapping[str, Sequence[float]]) -> None:
+        """Append values to the trajectory of every variable.
+
+        Args:
+            values (Mapping[str, Sequence[float]]): New values of each variable. All variables
+            must be given the same number of values.
+        """
+        if len(self._keys) == 0:
+            return
+        count = len(values[self._keys[0]])
+        self._reserve(self._length + count)
+        for key, column in self._columns.items():
+            self._data[column, self._length:self._length + count] = values[key]
+        self._length += count
+
+    def to_dict(self) -> dict[str, np.ndarray]:
+        return {key: self[key] for key in self._keys}
+
+    def _reserve(self, capacity: int) -> None:
+        if capacity <= self._data.shape[1]:
+            return
+        new_capacity = max(capacity, 2 * self._data.shape[1])
+        data = np.empty((len(self._keys), new_capacity), dtype=np.float64)
+        data[:, :self._length] = self._data[:, :self._length]
+        self._data = data
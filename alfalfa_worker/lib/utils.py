@@ -1,6 +1,12 @@
+import calendar
 import os
 import sys
 import traceback
+from datetime import datetime, timedelta
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
 
 
 def rel_symlink(src, dst):
@@ -32,3 +38,18 @@ def to_bool(value: str):
         elif value.lower() in true_strings:
             return True
     raise ValueError(f"Invalid string \"{value}\" provided for boolean conversion")
+
+
+def datetime_to_epoch(value: datetime) -> int:
+    """Convert a naive datetime to integer seconds since the epoch, without applying any timezone"""
+    return calendar.timegm(value.timetuple())
+
+
+def epoch_to_datetime(value: int) -> datetime:
+    """Convert integer seconds since the epoch to a naive datetime, without applying any timezone"""
+    return EPOCH + timedelta(seconds=value)
+
+
+def arrays_to_lists(data: dict[str, np.ndarray]) -> dict[str, list]:
+    """Convert a dictionary of numpy arrays to lists which can be serialized to json, with NaN values as None"""
+    return {key: np.where(np.isnan(values), None, values).tolist() for key, values in data.items()}
@@ -0,0 +1,60 @@
+"""Compare the throughput and size of the run archive formats.
+
+Usage:
+    python -m tests.benchmarks.archive_formats [model directories...]
+
+Defaults to the integration test models. Directories are archived as they are on disk, so
+point this at a run directory after a simulation to include EnergyPlus outputs.
+"""
+import io
+import sys
+import time
+from pathlib import Path
+
+import zstandard
+
+from alfalfa_worker.lib.archive import (
+    ArchiveFormat,
+    open_archive,
+    write_archive
+)
+
+MODELS_DIR = Path(__file__).parents[1] / 'integration' / 'models'
+
+
+def directory_size(path: Path) -> int:
+    return sum(file.stat().st_size for file in path.rglob('*') if file.is_file())
+
+
+def benchmark(path: Path, archive_format: ArchiveFormat) -> dict:
+    file = io.BytesIO()
+    start = time.perf_counter()
+    write_archive(file, path, path.name, archive_format)
+    write_time = time.perf_counter() - start
+
+    file.seek(0)
+    start = time.perf_counter()
+    with open_archive(file) as tar:
+        for member in tar:
+            if member.isfile():
+                tar.extractfile(member).read()
+    read_time = time.perf_counter() - start
+
+    return {'size': file.getbuffer().nbytes, 'write_time': write_time, 'read_time': read_time}
+
+
+def main(paths: list[Path]) -> None:
+    print(f"zstandard {zstandard.__version__} (libzstd {zstandard.ZSTD_VERSION[0]}.{zstandard.ZSTD_VERSION[1]}.{zstandard.ZSTD_VERSION[2]})")
+    print(f"{'model':<30} {'format':<6} {'ratio':>7} {'write MB/s':>11} {'read MB/s':>10}")
+    for path in paths:
+        raw_size = directory_size(path) / 1e6
+        for archive_format in ArchiveFormat:
+            result = benchmark(path, archive_format)
+            print(f"{path.name:<30} {archive_format.value.lower():<6} "
+                  f"{raw_size * 1e6 / result['size']:>7.2f} "
+                  f"{raw_size / result['write_time']:>11.1f} "
+                  f"{raw_size / result['read_time']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main([Path(arg) for arg in sys.argv[1:]] or sorted(path for path in MODELS_DIR.iterdir() if path.is_dir()))
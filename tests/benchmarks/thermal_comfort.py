@@ -0,0 +1,44 @@
+"""Compare ThermalComfort.pmv_ppd_array against calling ThermalComfort.pmv_ppd for each element.
+
+Usage:
+    python -m tests.benchmarks.thermal_comfort [zones] [timesteps]
+"""
+import sys
+import time
+
+import numpy as np
+
+from alfalfa_worker.lib.thermal_comfort import ThermalComfort
+
+
+def main(zones: int, timesteps: int) -> None:
+    rng = np.random.default_rng(0)
+    shape = (zones, timesteps)
+    ta = rng.uniform(15, 30, shape)
+    tr = ta + rng.uniform(-2, 2, shape)
+    met = rng.uniform(0.8, 2, shape)
+    clo = rng.uniform(0.3, 1.2, shape)
+    vel = rng.uniform(0.05, 0.5, shape)
+    rh = rng.uniform(20, 80, shape)
+
+    start = time.perf_counter()
+    pmv, ppd = ThermalComfort.pmv_ppd_array(ta, tr, met, clo, vel, rh)
+    array_time = time.perf_counter() - start
+
+    # The scalar function is slow, so time it on a sample of the elements
+    sample = min(pmv.size, 100000)
+    args = [array.ravel()[:sample] for array in (ta, tr, met, clo, vel, rh)]
+    start = time.perf_counter()
+    expected = np.array([ThermalComfort.pmv_ppd(*element) for element in zip(*args)])
+    scalar_time = (time.perf_counter() - start) * pmv.size / sample
+
+    print(f"{pmv.size} elements ({zones} zones x {timesteps} timesteps)")
+    print(f"pmv_ppd:       {scalar_time:.2f} s (extrapolated from {sample} elements)")
+    print(f"pmv_ppd_array: {array_time:.2f} s ({scalar_time / array_time:.0f}x faster)")
+    print(f"max difference: pmv {np.max(np.abs(pmv.ravel()[:sample] - expected[:, 0])):.2e}, "
+          f"ppd {np.max(np.abs(ppd.ravel()[:sample] - expected[:, 1])):.2e}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 525600 // 10)
@@ -0,0 +1,64 @@
+"""Compare the per step cost of storing TestCase results in a TrajectoryStore against
+concatenating lists, which is how results were stored previously.
+
+Usage:
+    python -m tests.benchmarks.trajectory_store [steps] [variables]
+"""
+import sys
+import time
+
+import numpy as np
+
+from alfalfa_worker.lib.trajectory_store import TrajectoryStore
+
+# List concatenation is quadratic, so only run it for the first steps
+LIST_STEPS = 20000
+
+
+def step_result(keys: list[str], step: int) -> dict[str, np.ndarray]:
+    # Each fmu.simulate call returns the start and end of the step
+    return {key: np.array([step * 60.0, (step + 1) * 60.0]) for key in keys}
+
+
+def benchmark_store(keys: list[str], steps: int, window: int) -> list[float]:
+    store = TrajectoryStore(keys)
+    costs = []
+    start = time.perf_counter()
+    for step in range(steps):
+        res = step_result(keys, step)
+        store.append({key: res[key][1:] for key in keys})
+        if (step + 1) % window == 0:
+            costs.append((time.perf_counter() - start) / window)
+            start = time.perf_counter()
+    return costs
+
+
+def benchmark_lists(keys: list[str], steps: int, window: int) -> list[float]:
+    store = {key: [] for key in keys}
+    costs = []
+    start = time.perf_counter()
+    for step in range(steps):
+        res = step_result(keys, step)
+        for key in keys:
+            store[key] = store[key] + res[key].tolist()[1:]
+        if (step + 1) % window == 0:
+            costs.append((time.perf_counter() - start) / window)
+            start = time.perf_counter()
+    return costs
+
+
+def main(steps: int, variables: int) -> None:
+    keys = ['time'] + [f'var_{i}' for i in range(variables - 1)]
+    window = steps // 10
+    store_costs = benchmark_store(keys, steps, window)
+    list_costs = benchmark_lists(keys, min(steps, LIST_STEPS), LIST_STEPS // 10)
+
+    print(f"TrajectoryStore, {variables} variables, us per step every {window} steps")
+    print(" ".join(f"{cost * 1e6:.1f}" for cost in store_costs))
+    print(f"List concatenation, {variables} variables, us per step every {LIST_STEPS // 10} steps")
+    print(" ".join(f"{cost * 1e6:.1f}" for cost in list_costs))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 20)
@@ -9,17 +9,18 @@ from tests.worker.lib.mock_job import MockJob
 
 class StepRunMockJob(MockJob, StepRunBase):
 
-    def __init__(self, run_id, realtime, timescale, external_clock, start_datetime, end_datetime):
+    def __init__(self, run_id, realtime, timescale, external_clock, start_datetime, end_datetime, batch=False, simulation_step_duration=1):
         super().__init__()
         self.checkout_run(run_id)
-        StepRunBase.__init__(self, run_id, realtime, timescale, external_clock, start_datetime, end_datetime)
+        StepRunBase.__init__(self, run_id, realtime, timescale, external_clock, start_datetime, end_datetime, batch)
         self.options.warmup_is_first_step = True
         self.options.timestep_duration = timedelta(minutes=1)
-        self.simulation_step_duration = 1
-        self.run.sim_time = self.options.start_datetime
+        self.simulation_step_duration = simulation_step_duration
+        self.advance_calls = 0
+        self.set_run_time(self.options.start_datetime)
 
     def get_sim_time(self) -> datetime.datetime:
-        return self.run.sim_time
+        return self.sim_time
 
     def initialize_simulation(self):
         pass
@@ -29,6 +30,9 @@ class StepRunMockJob(MockJob, StepRunBase):
         self.simulation_step_duration = simulation_step_duration
 
     @message
-    def advance(self):
-        sleep(self.simulation_step_duration)
-        self.run.sim_time = self.run.sim_time + self.options.timestep_duration
+    def advance(self, steps=1):
+        steps = self.check_advance_steps(steps)
+        self.advance_calls += 1
+        for _ in range(steps):
+            sleep(self.simulation_step_duration)
+            self.set_run_time(self.sim_time + self.options.timestep_duration)
@@ -7,10 +7,10 @@ class MockRedisPubSub():
         self.messages: SimpleQueue = SimpleQueue()
         self.channels = []
 
-    def get_message(self):
+    def get_message(self, timeout: float = 0.0):
         message = None
         try:
-            message = self.messages.get(False)
+            message = self.messages.get(timeout > 0, timeout if timeout > 0 else None)
             return message
         except Empty:
             return message
@@ -1,8 +1,9 @@
+import hashlib
 import shutil
 import sys
 from os import PathLike
 from pathlib import Path
-from typing import Dict, List
+from typing import BinaryIO, Callable, Dict, List
 from uuid import uuid4
 
 from alfalfa_worker.lib.logger_mixins import LoggerMixinBase
@@ -42,6 +43,9 @@ class MockRunManager(RunManager, LoggerMixinBase):
         self.tmp_dir = run_dir / 'tmp'
         if not self.tmp_dir.exists():
             self.tmp_dir.mkdir()
+        self.run_cache = None
+        self.checkin_async = False
+        self.uploads = {}
 
         # mock mongodb
         self.mongo_db = MockMongoDB()
@@ -58,6 +62,19 @@ class MockRunManager(RunManager, LoggerMixinBase):
         except Exception as e:
             print(e, file=sys.stderr)
 
+    def s3_download_stream(self, key: str) -> BinaryIO:
+        return open(self.s3_dir / key, 'rb')
+
+    def s3_upload_stream(self, write: Callable[[BinaryIO], None], key: str):
+        with open(self.s3_dir / key, 'wb') as file:
+            write(file)
+
+    def s3_etag(self, key: str) -> str:
+        path = self.s3_dir / key
+        if not path.exists():
+            return None
+        return hashlib.md5(path.read_bytes()).hexdigest()
+
     def register_run(self, run: Run):
         self.runs[run.ref_id] = run
 
@@ -0,0 +1,35 @@
+import io
+
+import pytest
+
+from alfalfa_worker.lib.archive import (
+    ArchiveFormat,
+    open_archive,
+    write_archive
+)
+
+
+@pytest.mark.parametrize('archive_format', [ArchiveFormat.GZ, ArchiveFormat.ZST, ArchiveFormat.NONE])
+def test_archive_round_trip(tmp_path, archive_format):
+    run_dir = tmp_path / 'run'
+    run_dir.mkdir()
+    (run_dir / 'model.idf').write_text('Version,22.1;')
+
+    file = io.BytesIO()
+    write_archive(file, run_dir, 'run_id', archive_format)
+    file.seek(0)
+
+    with open_archive(file) as tar:
+        tar.extractall(tmp_path / 'extracted')
+    assert (tmp_path / 'extracted' / 'run_id' / 'model.idf').read_text() == 'Version,22.1;'
+
+
+def test_archive_format_from_env(monkeypatch):
+    monkeypatch.delenv('RUN_ARCHIVE_FORMAT', raising=False)
+    assert ArchiveFormat.from_env() == ArchiveFormat.GZ
+    monkeypatch.setenv('RUN_ARCHIVE_FORMAT', 'zst')
+    assert ArchiveFormat.from_env() == ArchiveFormat.ZST
+    assert ArchiveFormat.ZST.extension == '.tar.zst'
+    monkeypatch.setenv('RUN_ARCHIVE_FORMAT', 'bz2')
+    with pytest.raises(ValueError, match='RUN_ARCHIVE_FORMAT'):
+        ArchiveFormat.from_env()
@@ -0,0 +1,80 @@
+import os
+import threading
+from multiprocessing import get_context
+
+import pytest
+
+from alfalfa_worker.lib.batch_writer import BatchWriter, DropPolicy
+
+
+class ListWriter(BatchWriter):
+
+    def __init__(self, *args, succeed=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.succeed = succeed
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def _write(self, batch):
+        self.release.wait()
+        self.batches.append((os.getpid(), batch))
+        return self.succeed
+
+
+def test_batch_writer_block_policy():
+    writer = ListWriter(max_queue_size=2, batch_size=2, flush_interval=60, drop_policy=DropPolicy.BLOCK)
+    writer.release.clear()
+    producer = threading.Thread(target=writer.put, args=(list(range(10)),))
+    producer.start()
+    # The producer waits for room in the queue instead of dropping items
+    producer.join(0.2)
+    assert producer.is_alive()
+    writer.release.set()
+    producer.join(5)
+    assert not producer.is_alive()
+    writer.close(timeout=5)
+
+    assert [item for _, batch in writer.batches for item in batch] == list(range(10))
+    assert writer._dropped.value == 0
+    assert writer._written.value == 10
+
+
+def test_batch_writer_counts_failures():
+    writer = ListWriter(max_queue_size=10, batch_size=2, flush_interval=60, succeed=False)
+    writer.put(list(range(3)))
+    writer.close(timeout=5)
+    assert writer._queued.value == 3
+    assert writer._failed.value == 3
+    assert writer._written.value == 0
+
+
+def write_in_subprocess(writer):
+    writer.put([1, 2])
+    writer.close(timeout=5)
+    # The subprocess writes from its own thread rather than the one inherited from the parent
+    assert writer.batches[-1] == (os.getpid(), [1, 2])
+
+
+def test_batch_writer_starts_in_each_process():
+    writer = ListWriter(max_queue_size=10, batch_size=10, flush_interval=60)
+    writer.put([0])
+    assert writer.flush(timeout=5)
+
+    process = get_context('fork').Process(target=write_in_subprocess, args=(writer,))
+    process.start()
+    process.join(10)
+    assert process.exitcode == 0
+    # The counters are shared with the subprocess
+    assert writer._written.value == 3
+    writer.close(timeout=5)
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'max_queue_size': 0, 'batch_size': 1, 'flush_interval': 1},
+    {'max_queue_size': 1, 'batch_size': 0, 'flush_interval': 1},
+    {'max_queue_size': 1, 'batch_size': 1, 'flush_interval': -1}
+])
+def test_batch_writer_invalid_settings(kwargs):
+    with pytest.raises(ValueError):
+        ListWriter(**kwargs)
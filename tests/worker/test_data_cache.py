@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from alfalfa_worker.lib.data.data_cache import Data_Cache
+
+
+def make_data():
+    index = np.arange(0., 3.1536e+7, 3600., dtype='int')
+    data = pd.DataFrame(index=index, columns=['weaSta_reaWeaTDryBul_y', 'PriceElectricPowerConstant'])
+    data.loc[:, 'weaSta_reaWeaTDryBul_y'] = np.linspace(273.15, 300.15, len(index))
+    return data.rename_axis('time').astype(float)
+
+
+def test_data_cache_round_trip(tmp_path):
+    data_cache = Data_Cache(cache_dir=str(tmp_path))
+    data = make_data()
+    assert data_cache.load('fmu_hash') == (None, None)
+
+    data_cache.save('fmu_hash', data, {'Power': ['fcu_reaPFan_y']})
+    cached_data, kpi_json = data_cache.load('fmu_hash')
+
+    pd.testing.assert_frame_equal(cached_data, data)
+    assert kpi_json == {'Power': ['fcu_reaPFan_y']}
+
+
+def test_data_cache_float32(tmp_path):
+    data_cache = Data_Cache(cache_dir=str(tmp_path), float32=True)
+    data = make_data()
+
+    data_cache.save('fmu_hash', data, {})
+    cached_data, _ = data_cache.load('fmu_hash')
+
+    assert cached_data['weaSta_reaWeaTDryBul_y'].dtype == np.float32
+    np.testing.assert_allclose(cached_data['weaSta_reaWeaTDryBul_y'], data['weaSta_reaWeaTDryBul_y'], rtol=1e-6)
+
+
+def test_hash_file(tmp_path):
+    (tmp_path / 'a.fmu').write_bytes(b'model')
+    (tmp_path / 'b.fmu').write_bytes(b'other model')
+    assert Data_Cache.hash_file(tmp_path / 'a.fmu') != Data_Cache.hash_file(tmp_path / 'b.fmu')
+
+
+def test_make_key(tmp_path):
+    (tmp_path / 'a.fmu').write_bytes(b'model')
+    categories = {'weather': ['weaSta_reaWeaTDryBul_y'], 'prices': ['PriceElectricPowerConstant']}
+    data_cache = Data_Cache(cache_dir=str(tmp_path))
+    key = data_cache.make_key(tmp_path / 'a.fmu', categories)
+
+    assert key == data_cache.make_key(tmp_path / 'a.fmu', dict(reversed(categories.items())))
+    assert key != data_cache.make_key(tmp_path / 'a.fmu', {'weather': ['weaSta_reaWeaTDryBul_y']})
+    assert key != Data_Cache(cache_dir=str(tmp_path), float32=True).make_key(tmp_path / 'a.fmu', categories)
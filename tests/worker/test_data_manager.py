@@ -0,0 +1,102 @@
+import json
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import interpolate
+
+pytest.importorskip('matplotlib')
+
+from alfalfa_worker.lib.data import data_manager as data_manager_module  # noqa: E402
+from alfalfa_worker.lib.data.data_manager import Data_Manager  # noqa: E402
+
+YEAR = 3.1536e+7
+
+
+@pytest.fixture
+def data_manager():
+    with open(os.path.join(os.path.dirname(data_manager_module.__file__), 'categories.json')) as f:
+        categories = json.load(f)
+    # A year of 15 minute data with noisy daily cycles for the weather
+    # and values which step every few hours for the other categories
+    index = np.arange(0., YEAR + 1, 900.)
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(index=pd.Index(index, name='time'))
+    for category, keys in categories.items():
+        for key in keys:
+            if category == 'weather':
+                data[key] = 10 * np.sin(index / 86400 * 2 * np.pi) + rng.normal(0, 0.5, len(index))
+            else:
+                data[key] = rng.integers(0, 10, len(index) // 16 + 1).repeat(16)[:len(index)].astype(float)
+
+    case = SimpleNamespace(data=data, start_time=0, step=60.)
+    manager = Data_Manager.__new__(Data_Manager)
+    manager.case = case
+    manager.categories = categories
+    manager._interpolation_data = None
+    return manager
+
+
+def legacy_get_data(manager, horizon=24 * 3600, interval=None, index=None, category=None):
+    """Implementation of get_data before the interpolation used numpy arrays"""
+    if category is not None:
+        data_slice = manager.case.data.loc[:, manager.categories[category]]
+    else:
+        data_slice = manager.case.data
+    if index is None:
+        start = manager.case.start_time
+        stop = start + horizon
+        if interval is None:
+            interval = manager.case.step
+        index = np.arange(start, stop, interval).astype(int)
+    data_slice_reindexed = data_slice.reindex(index)
+    for key in data_slice_reindexed.keys():
+        if key in manager.categories['weather']:
+            f = interpolate.interp1d(manager.case.data.index, manager.case.data[key], kind='linear')
+        else:
+            f = interpolate.interp1d(manager.case.data.index, manager.case.data[key], kind='zero')
+        data_slice_reindexed.loc[:, key] = f(index)
+    return data_slice_reindexed.reset_index().to_dict('list')
+
+
+def assert_parity(data, expected):
+    assert sorted(data.keys()) == sorted(expected.keys())
+    for key, values in expected.items():
+        np.testing.assert_allclose(data[key], values, rtol=1e-12, err_msg=key)
+
+
+@pytest.mark.parametrize('kwargs', [
+    # Default horizon and step from the start of the year
+    {},
+    # Aligned with the data
+    {'horizon': 6 * 3600, 'interval': 900},
+    # Between the rows of the data
+    {'horizon': 6 * 3600, 'interval': 7},
+    {'index': np.array([1, 449, 450, 451, 899, 901, 12 * 3600 - 1, 12 * 3600, 12 * 3600 + 1])},
+    # The first and last rows of the data
+    {'index': np.array([0, 900, YEAR - 900, YEAR])},
+    {'index': np.array([YEAR])},
+    # Unsorted
+    {'index': np.array([86400 * 100 + 13, 17, 86400 * 200 + 450])},
+])
+@pytest.mark.parametrize('category', [None, 'weather', 'prices', 'occupancy', 'setpoints'])
+def test_get_data_parity(data_manager, kwargs, category):
+    assert_parity(data_manager.get_data(category=category, **kwargs),
+                  legacy_get_data(data_manager, category=category, **kwargs))
+
+
+def test_get_data_parity_end_of_year(data_manager):
+    # A forecast of the last day of the data
+    data_manager.case.start_time = YEAR - 24 * 3600
+    assert_parity(data_manager.get_data(interval=300), legacy_get_data(data_manager, interval=300))
+
+
+@pytest.mark.parametrize('index', [np.array([YEAR - 60, YEAR + 60]), np.array([-1, 60])])
+def test_get_data_outside_of_year(data_manager, index):
+    # Neither implementation wraps around the end of the year
+    with pytest.raises(ValueError):
+        legacy_get_data(data_manager, index=index)
+    with pytest.raises(ValueError):
+        data_manager.get_data(index=index)
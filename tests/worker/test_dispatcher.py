@@ -1,4 +1,12 @@
-from alfalfa_worker.dispatcher import Dispatcher
+import logging
+import os
+import sys
+from multiprocessing import get_context
+
+import pytest
+
+from alfalfa_worker import dispatcher as dispatcher_module
+from alfalfa_worker.dispatcher import SLOTS_TTL, Dispatcher
 from alfalfa_worker.jobs.openstudio.create_run import CreateRun
 # from alfalfa_worker.jobs.openstudio.step_run import StepRun
 from alfalfa_worker.lib.job import JobStatus
@@ -33,3 +41,106 @@ def test_test_job_start(dispatcher):
     test_job = dispatcher.start_job(BasicMockJob.job_path(), params)
     wait_for_job_status(test_job, JobStatus.RUNNING)
     test_job.stop()
+
+
+def test_slots_from_env(monkeypatch):
+    monkeypatch.delenv('WORKER_SLOTS', raising=False)
+    assert Dispatcher.slots_from_env() == 1
+    monkeypatch.setenv('WORKER_SLOTS', '4')
+    assert Dispatcher.slots_from_env() == 4
+    monkeypatch.setenv('WORKER_SLOTS', 'auto')
+    assert Dispatcher.slots_from_env() == os.cpu_count()
+
+
+class MockRedis:
+    def __init__(self, messages=()):
+        self.hashes = {}
+        self.expirations = {}
+        self.messages = list(messages)
+        self.brpop_calls = 0
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    def expire(self, key, seconds):
+        self.expirations[key] = seconds
+
+    def delete(self, key):
+        self.hashes.pop(key, None)
+
+    def brpop(self, key, timeout=0):
+        self.brpop_calls += 1
+        if len(self.messages) == 0:
+            return None
+        return key, self.messages.pop(0)
+
+
+@pytest.fixture
+def pool_dispatcher():
+    dispatcher = Dispatcher.__new__(Dispatcher)
+    dispatcher.logger = logging.getLogger('Dispatcher')
+    dispatcher.redis = MockRedis()
+    dispatcher.job_queue = 'Alfalfa Job Queue'
+    dispatcher.slots = 2
+    dispatcher.job_processes = []
+    dispatcher.slots_key = 'dispatcher:host:1'
+    return dispatcher
+
+
+def exit_with(code):
+    sys.exit(code)
+
+
+def test_reap_job_processes(pool_dispatcher):
+    context = get_context('fork')
+    # A job which finished and one which crashed
+    processes = [context.Process(target=exit_with, args=(code,)) for code in (0, 1)]
+    for process in processes:
+        process.start()
+        process.join()
+    pool_dispatcher.job_processes = list(processes)
+
+    assert pool_dispatcher.reap_job_processes() == 0
+    assert pool_dispatcher.job_processes == []
+    assert pool_dispatcher.redis.hashes['dispatcher:host:1'] == {'slots': 2, 'busy_slots': 0}
+
+
+def test_pool_does_not_pop_when_slots_are_busy(pool_dispatcher, monkeypatch):
+    context = get_context('fork')
+    stop = context.Event()
+    processes = [context.Process(target=stop.wait) for _ in range(2)]
+    for process in processes:
+        process.start()
+    pool_dispatcher.job_processes = list(processes)
+    pool_dispatcher.redis.messages.append(b'{"job": "Job"}')
+    waits = []
+    monkeypatch.setattr(dispatcher_module, 'wait', lambda sentinels, timeout: waits.append(sentinels))
+
+    try:
+        pool_dispatcher.run_pool_once()
+        assert pool_dispatcher.redis.brpop_calls == 0
+        assert waits == [[process.sentinel for process in processes]]
+    finally:
+        stop.set()
+        for process in processes:
+            process.join()
+
+    # Once the processes exit the message is popped and a job is started in a free slot
+    started = []
+    monkeypatch.setattr(pool_dispatcher, 'start_job_process', lambda job, params: started.append(job))
+    pool_dispatcher.run_pool_once()
+    assert pool_dispatcher.redis.brpop_calls == 1
+    assert started == ['Job']
+
+
+def test_pool_slots_expire(pool_dispatcher, monkeypatch):
+    pool_dispatcher.publish_slots()
+    assert pool_dispatcher.redis.expirations['dispatcher:host:1'] == SLOTS_TTL
+
+    # The slots are removed when the pool exits
+    def interrupt():
+        raise KeyboardInterrupt()
+    monkeypatch.setattr(pool_dispatcher, 'run_pool_once', interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        pool_dispatcher.run_pool()
+    assert 'dispatcher:host:1' not in pool_dispatcher.redis.hashes
@@ -0,0 +1,63 @@
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from alfalfa_worker.jobs.openstudio.lib.epw_weather import (
+    YEAR_SECONDS,
+    EPWWeather,
+    seconds_of_year
+)
+from alfalfa_worker.lib.utils import arrays_to_lists
+
+EPW_PATH = Path(__file__).parents[1] / 'integration' / 'models' / 'small_office' / 'weather' / 'USA_OH_Dayton-Wright.Patterson.AFB.745700_TMY3.epw'
+
+
+@pytest.fixture
+def weather():
+    return EPWWeather(EPW_PATH)
+
+
+def test_epw_weather_values(weather: EPWWeather):
+    # The first record of the file is for the hour ending at 01:00
+    data = weather.get_data(3600, 1, 60)
+    assert data['TDryBul'][0] == pytest.approx(12.0 + 273.15)
+    assert data['relHum'][0] == pytest.approx(1.0)
+    assert data['pAtm'][0] == pytest.approx(99500)
+    assert data['winDir'][0] == pytest.approx(np.deg2rad(240))
+
+
+def test_epw_weather_interpolation(weather: EPWWeather):
+    data = weather.get_data(3600, 3600, 900)
+    assert data['time'].tolist() == [3600, 4500, 5400, 6300]
+    assert data['TDryBul'][2] == pytest.approx((data['TDryBul'][0] + weather.get_data(7200, 1, 1)['TDryBul'][0]) / 2)
+
+
+def test_epw_weather_wraps_year(weather: EPWWeather):
+    data = weather.get_data(YEAR_SECONDS, 2 * 3600, 3600)
+    assert data['TDryBul'][0] == pytest.approx(weather.get_data(0, 1, 1)['TDryBul'][0])
+    assert data['TDryBul'][1] == pytest.approx(weather.get_data(3600, 1, 1)['TDryBul'][0])
+
+
+def test_epw_weather_missing_values(tmp_path):
+    lines = EPW_PATH.read_text().splitlines(keepends=True)
+    # Mark the dry bulb temperature of the second record as missing
+    record = lines[9].split(',')
+    record[6] = '99.9'
+    lines[9] = ','.join(record)
+    (tmp_path / 'weather.epw').write_text(''.join(lines))
+
+    data = EPWWeather(tmp_path / 'weather.epw').get_data(3600, 2 * 3600 + 1, 3600)
+    assert data['TDryBul'][1] == pytest.approx((data['TDryBul'][0] + data['TDryBul'][2]) / 2)
+
+
+def test_seconds_of_year():
+    assert seconds_of_year(datetime(2019, 3, 1)) == 59 * 86400
+    # Leap years count the same as the weather data, which has no leap day
+    assert seconds_of_year(datetime(2020, 3, 1, 12)) == 59 * 86400 + 12 * 3600
+    assert seconds_of_year(datetime(2020, 2, 29, 6)) == 58 * 86400 + 6 * 3600
+
+
+def test_arrays_to_lists():
+    assert arrays_to_lists({'a': np.array([1.0, np.nan])}) == {'a': [1.0, None]}
@@ -0,0 +1,90 @@
+import threading
+from time import monotonic, sleep
+
+import pytest
+
+from alfalfa_worker.lib.historian import DropPolicy, HistorianWriter
+
+
+class MockInfluxClient:
+
+    def __init__(self, response=True):
+        self.response = response
+        self.writes = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def write_points(self, points, time_precision, database):
+        self.release.wait()
+        self.writes.append(points)
+        return self.response
+
+
+def make_points(n):
+    return [{"fields": {"value": i}, "measurement": "run", "time": i} for i in range(n)]
+
+
+def test_historian_batches_points():
+    client = MockInfluxClient()
+    historian = HistorianWriter(client, "alfalfa", max_queue_size=100, batch_size=10, flush_interval=60)
+    for _ in range(5):
+        historian.write_points(make_points(5))
+    historian.close(timeout=5)
+
+    assert sum(len(batch) for batch in client.writes) == 25
+    assert all(len(batch) <= 10 for batch in client.writes)
+    assert historian.stats() == {
+        'historian_queued': 25,
+        'historian_dropped': 0,
+        'historian_written': 25,
+        'historian_failed': 0
+    }
+
+
+def test_historian_flush_interval():
+    client = MockInfluxClient()
+    historian = HistorianWriter(client, "alfalfa", batch_size=1000, flush_interval=0.1)
+    historian.write_points(make_points(3))
+    assert historian.flush(timeout=5)
+    assert client.writes == [make_points(3)]
+    historian.close(timeout=5)
+
+
+def test_historian_drop_policies():
+    for drop_policy, expected_values in [(DropPolicy.DROP_OLDEST, [5, 6, 7, 8, 9]),
+                                         (DropPolicy.DROP_NEWEST, [0, 1, 2, 3, 4])]:
+        client = MockInfluxClient()
+        client.release.clear()
+        historian = HistorianWriter(client, "alfalfa", max_queue_size=5, batch_size=100, flush_interval=60, drop_policy=drop_policy)
+        historian.write_points(make_points(10))
+        assert historian.stats()['historian_dropped'] == 5
+        client.release.set()
+        historian.close(timeout=5)
+        assert [point["fields"]["value"] for point in client.writes[0]] == expected_values
+
+
+def test_historian_failed_writes():
+    client = MockInfluxClient(response=False)
+    historian = HistorianWriter(client, "alfalfa", batch_size=2, flush_interval=60)
+    historian.write_points(make_points(4))
+    historian.close(timeout=5)
+    assert historian.stats()['historian_failed'] == 4
+    assert historian.stats()['historian_written'] == 0
+
+
+def test_historian_explicit_zero_settings(monkeypatch):
+    monkeypatch.setenv('HISTORIAN_FLUSH_INTERVAL', '60')
+    client = MockInfluxClient()
+    # A flush interval of 0 writes points as soon as they are queued instead of using the environment
+    historian = HistorianWriter(client, "alfalfa", batch_size=1000, flush_interval=0)
+    assert historian.flush_interval == 0
+    historian.write_points(make_points(3))
+    deadline = monotonic() + 5
+    while len(client.writes) == 0 and monotonic() < deadline:
+        sleep(0.01)
+    assert client.writes == [make_points(3)]
+    historian.close(timeout=5)
+
+    for kwargs in [{'max_queue_size': 0}, {'batch_size': 0}, {'flush_interval': -1}]:
+        with pytest.raises(ValueError):
+            HistorianWriter(client, "alfalfa", **kwargs)
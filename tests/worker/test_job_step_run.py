@@ -1,5 +1,6 @@
 
-from datetime import datetime
+import math
+from datetime import datetime, timedelta
 from time import sleep
 
 import pytest
@@ -32,6 +33,23 @@ def step_run_mock_job(dispatcher: Dispatcher):
     yield dispatcher.create_job(StepRunMockJob.job_path(), params)
 
 
+@pytest.fixture
+def external_clock_mock_job(dispatcher: Dispatcher):
+    run = dispatcher.run_manager.create_empty_run()
+    dispatcher.run_manager.checkin_run(run)
+
+    params = {
+        "run_id": run.ref_id,
+        "external_clock": True,
+        "start_datetime": str(datetime(2019, 1, 2, 0, 0, 0)),
+        "end_datetime": str(datetime(2019, 1, 3, 0, 0, 0)),
+        "timescale": "1",
+        "realtime": False
+    }
+
+    yield dispatcher.create_job(StepRunMockJob.job_path(), params)
+
+
 def test_timescale(step_run_mock_job: StepRunMockJob):
 
     step_run_mock_job.start()
@@ -46,6 +64,10 @@ def test_timescale(step_run_mock_job: StepRunMockJob):
 
     assert run.sim_time > first_time
 
+    metrics = send_message_and_wait(step_run_mock_job, 'get_metrics')['response']
+    assert metrics['timescale_advance_count'] > 0
+    assert metrics['timescale_lag_max'] >= metrics['timescale_lag_mean'] >= 0
+
     send_message_and_wait(step_run_mock_job, 'stop')
 
     wait_for_job_status(step_run_mock_job, JobStatus.STOPPED)
@@ -66,3 +88,55 @@ def test_timescale_error(step_run_mock_job: StepRunMockJob):
 
     wait_for_job_status(step_run_mock_job, JobStatus.ERROR)
     wait_for_run_status(run, RunStatus.ERROR)
+
+
+def test_advance_multiple_steps(external_clock_mock_job: StepRunMockJob):
+    external_clock_mock_job.start()
+    run = external_clock_mock_job.run
+
+    wait_for_job_status(external_clock_mock_job, JobStatus.WAITING)
+    wait_for_run_status(run, RunStatus.RUNNING)
+    send_message_and_wait(external_clock_mock_job, 'set_simulation_step_duration', {'simulation_step_duration': 0})
+    start_time = run.sim_time
+
+    response = send_message_and_wait(external_clock_mock_job, 'advance', {'steps': 5})
+    assert response['status'] == 'ok'
+    assert run.sim_time == start_time + timedelta(minutes=5)
+
+    # A time within a timestep advances to the end of that timestep
+    target_time = start_time + timedelta(minutes=10, seconds=30)
+    response = send_message_and_wait(external_clock_mock_job, 'advance_to', {'sim_time': str(target_time)})
+    assert response['status'] == 'ok'
+    assert run.sim_time == start_time + timedelta(minutes=11)
+
+    assert send_message_and_wait(external_clock_mock_job, 'advance', {'steps': 0})['status'] == 'error'
+    assert send_message_and_wait(external_clock_mock_job, 'advance_to', {'sim_time': str(start_time)})['status'] == 'error'
+    assert run.sim_time == start_time + timedelta(minutes=11)
+
+    send_message_and_wait(external_clock_mock_job, 'stop')
+    wait_for_job_status(external_clock_mock_job, JobStatus.STOPPED)
+
+
+def test_batch(dispatcher: Dispatcher):
+    run = dispatcher.run_manager.create_empty_run()
+    dispatcher.run_manager.checkin_run(run)
+
+    params = {
+        "run_id": run.ref_id,
+        "external_clock": False,
+        "start_datetime": str(datetime(2019, 1, 2, 0, 0, 0)),
+        "end_datetime": str(datetime(2019, 1, 2, 3, 0, 0)),
+        "timescale": "1",
+        "realtime": False,
+        "batch": True,
+        "simulation_step_duration": 0
+    }
+    batch_mock_job = dispatcher.create_job(StepRunMockJob.job_path(), params)
+    batch_mock_job.start()
+    run = batch_mock_job.run
+
+    wait_for_job_status(batch_mock_job, JobStatus.STOPPED)
+    wait_for_run_status(run, RunStatus.COMPLETE)
+    assert run.sim_time == datetime(2019, 1, 2, 3, 0, 0)
+    # The run is advanced batch_input_interval steps at a time
+    assert batch_mock_job.advance_calls == math.ceil(180 / batch_mock_job.options.batch_input_interval)
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from scipy.integrate import trapezoid
+
+from alfalfa_worker.lib.kpi_accumulator import KPIAccumulator
+
+
+def test_kpi_accumulator_update():
+    times = np.arange(0, 3600 * 24 + 1, 60.0)
+    power = 1000 + 500 * np.sin(times / 3600)
+    accumulator = KPIAccumulator(['power'])
+
+    # Integrate one step at a time and a few steps at once
+    accumulator.update(times[:1], {'power': power[:1]})
+    for i in range(1, 100):
+        accumulator.update(times[i:i + 1], {'power': power[i:i + 1]})
+    accumulator.update(times[100:], {'power': power[100:]})
+
+    assert accumulator.integral('power') == pytest.approx(trapezoid(power, times))
+
+
+def test_kpi_accumulator_add():
+    accumulator = KPIAccumulator(['Electricity', 'NaturalGas'])
+    accumulator.add({'Electricity': 3600.0, 'NaturalGas': float('nan')})
+    accumulator.add({'Electricity': 1800.0})
+
+    assert accumulator.integral('Electricity') == 5400.0
+    assert accumulator.integral('NaturalGas') == 0.0
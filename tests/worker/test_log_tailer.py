@@ -0,0 +1,76 @@
+from pathlib import Path
+
+from alfalfa_worker.lib.log_tailer import LogTailer
+
+
+def test_log_tailer_reads_appended_text(tmp_path: Path):
+    log_path = tmp_path / 'simulation' / 'eplusout.err'
+    log_path.parent.mkdir()
+    log_path.write_text("Program Version,EnergyPlus\n")
+    tailer = LogTailer(tmp_path, '**/*.err')
+
+    tailer.update()
+    assert tailer.logs() == {log_path: "Program Version,EnergyPlus\n"}
+
+    with log_path.open('a') as f:
+        f.write("   ** Warning ** Something\n")
+    tailer.update()
+    assert tailer.logs()[log_path] == "Program Version,EnergyPlus\n   ** Warning ** Something\n"
+
+
+def test_log_tailer_discovers_new_files(tmp_path: Path):
+    tailer = LogTailer(tmp_path, '**/*.err', discover_interval=3600)
+    tailer.update()
+    assert tailer.logs() == {}
+
+    log_path = tmp_path / 'eplusout.err'
+    log_path.write_text("error")
+    # New files are only searched for after the discover interval unless requested
+    tailer.update()
+    assert tailer.logs() == {}
+    tailer.update(discover=True)
+    assert tailer.logs() == {log_path: "error"}
+
+
+def test_log_tailer_contains(tmp_path: Path):
+    log_path = tmp_path / 'eplusout.err'
+    log_path.write_text("************* EnergyPlus Warmup")
+    tailer = LogTailer(tmp_path, '*.err')
+    tailer.update()
+    assert not tailer.contains("EnergyPlus Terminated")
+
+    # A match which straddles two reads is found
+    with log_path.open('a') as f:
+        f.write(" Error Summary\n************* EnergyPlus Term")
+    tailer.update()
+    assert not tailer.contains("EnergyPlus Terminated")
+    with log_path.open('a') as f:
+        f.write("inated--Fatal Error Detected.")
+    tailer.update()
+    assert tailer.contains("EnergyPlus Terminated")
+    assert tailer.contains("EnergyPlus Terminated")
+
+
+def test_log_tailer_truncated_file(tmp_path: Path):
+    log_path = tmp_path / 'eplusout.err'
+    log_path.write_text("first run with a long log")
+    tailer = LogTailer(tmp_path, '*.err')
+    tailer.update()
+
+    log_path.write_text("second run")
+    tailer.update()
+    assert tailer.logs() == {log_path: "second run"}
+
+
+def test_log_tailer_split_utf8(tmp_path: Path):
+    log_path = tmp_path / 'eplusout.err'
+    encoded = "temperature 20 °C".encode()
+    split = encoded.index(b'\xc2') + 1
+    log_path.write_bytes(encoded[:split])
+    tailer = LogTailer(tmp_path, '*.err')
+    tailer.update()
+
+    with log_path.open('ab') as f:
+        f.write(encoded[split:])
+    tailer.update()
+    assert tailer.logs() == {log_path: "temperature 20 °C"}
@@ -0,0 +1,19 @@
+from alfalfa_worker.dispatcher import Dispatcher
+from alfalfa_worker.jobs.openstudio.lib.openstudio_point import OpenStudioPoint
+from alfalfa_worker.lib.enums import PointType
+from alfalfa_worker.lib.models import Point
+
+
+def test_attach_points_renames_conflicts(dispatcher: Dispatcher):
+    run = dispatcher.run_manager.create_empty_run()
+    run.add_point(Point(ref_id="zone_temp", name="Zone Temperature", point_type=PointType.OUTPUT))
+
+    points = [OpenStudioPoint(id="zone_temp", name="Zone Temperature"),
+              OpenStudioPoint(id="zone_temp", name="Zone Temperature"),
+              OpenStudioPoint(id="setpoint", name="Setpoint", input={"type": "GlobalVariable", "parameters": {"variable_name": "setpoint"}})]
+    OpenStudioPoint.attach_points(points, run)
+
+    assert [point.point.ref_id for point in points] == ["zone_temp_1", "zone_temp_1_1", "setpoint"]
+    assert all(point.point.pk is not None for point in points)
+    assert sorted(point.ref_id for point in run.points) == ["setpoint", "zone_temp", "zone_temp_1", "zone_temp_1_1"]
+    assert [point.ref_id for point in run.input_points] == ["setpoint"]
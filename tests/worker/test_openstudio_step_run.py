@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+pytest.importorskip('openstudio')
+pytest.importorskip('pyenergyplus')
+
+from alfalfa_worker.jobs.openstudio.step_run import StepRun  # noqa: E402
+from alfalfa_worker.lib.job_exception import (  # noqa: E402
+    JobExceptionExternalProcess
+)
+from alfalfa_worker.lib.kpi_accumulator import KPIAccumulator  # noqa: E402
+from alfalfa_worker.lib.log_tailer import LogTailer  # noqa: E402
+
+
+def test_update_kpis_skips_fast_forward():
+    ep_api = MagicMock()
+    # Each timestep uses 1000 J of electricity
+    ep_api.exchange.get_meter_value.return_value = 1000
+    step_run = SimpleNamespace(ep_api=ep_api, ep_state=None, fast_forwarding=True,
+                               kpi_meters={'Electricity': SimpleNamespace(handle=1)},
+                               kpis=KPIAccumulator(['Electricity']))
+
+    # Timesteps from midnight to the start time
+    for _ in range(3):
+        StepRun.update_kpis(step_run)
+    assert step_run.kpis.integral('Electricity') == 0
+
+    step_run.fast_forwarding = False
+    StepRun.update_kpis(step_run)
+    assert step_run.kpis.integral('Electricity') == 1000
+
+
+def test_check_for_errors_discovers_late_error_logs(tmp_path):
+    step_run = StepRun.__new__(StepRun)
+    step_run.simulation_process = SimpleNamespace(exitcode=None)
+    step_run.error_logs = LogTailer(tmp_path, '**/*.err', discover_interval=3600)
+    step_run.check_for_errors()
+
+    # The error log is written after the last discovery of log files
+    (tmp_path / 'simulation').mkdir()
+    (tmp_path / 'simulation' / 'eplusout.err').write_text("** Severe  ** Bad input\n**  Fatal  ** EnergyPlus Terminated\n")
+    step_run.check_for_errors()
+
+    with pytest.raises(JobExceptionExternalProcess) as exc_info:
+        step_run.check_for_errors(exited=True)
+    assert "Bad input" in exc_info.value.__notes__[0]
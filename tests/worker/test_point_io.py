@@ -0,0 +1,61 @@
+from multiprocessing import get_context
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from alfalfa_worker.dispatcher import Dispatcher
+from alfalfa_worker.lib.enums import PointType
+from alfalfa_worker.lib.models import Point
+from alfalfa_worker.lib import point_io as point_io_module
+from alfalfa_worker.lib.point_io import PointIO
+
+
+def test_batched_point_io(dispatcher: Dispatcher):
+    run = dispatcher.run_manager.create_empty_run()
+    input_point = Point(ref_id="input", name="Input", point_type=PointType.INPUT)
+    output_point = Point(ref_id="output", name="Output", point_type=PointType.OUTPUT)
+    run.add_point(input_point)
+    run.add_point(output_point)
+
+    point_io = PointIO()
+    point_io.begin_step()
+
+    assert point_io.read_inputs([input_point]) == [None]
+    run.redis.rpush(input_point.redis_key + ':in', '', '12.5')
+    assert point_io.read_inputs([input_point]) == [12.5]
+
+    point_io.write_outputs([(output_point, 3.0)])
+    assert run.redis.hget(output_point.redis_key + ':out', 'curVal') == b'n:3.0'
+
+    point_io.begin_step()
+    assert point_io.round_trips == 3
+    assert point_io.last_step_round_trips == 3
+
+
+def write_step(point_io: PointIO, output_point: SimpleNamespace) -> None:
+    point_io.begin_step()
+    for _ in range(2):
+        point_io.write_outputs([(output_point, 1.0)])
+
+
+def test_round_trips_are_shared_with_subprocess(monkeypatch):
+    redis = MagicMock()
+    redis.pipeline.return_value.__len__.return_value = 1
+    monkeypatch.setattr(point_io_module, 'AlafalfaConnectionsManager', lambda: SimpleNamespace(redis=redis))
+    output_point = SimpleNamespace(run="run", point_type=PointType.OUTPUT, redis_key="run:run:point:output")
+
+    point_io = PointIO()
+    process = get_context('fork').Process(target=write_step, args=(point_io, output_point))
+    process.start()
+    process.join(10)
+    assert process.exitcode == 0
+    assert point_io.stats() == {
+        'point_io_round_trips': 2,
+        'point_io_last_step_round_trips': 0
+    }
+
+    # The step made in the subprocess is completed from the job process
+    point_io.begin_step()
+    assert point_io.stats() == {
+        'point_io_round_trips': 2,
+        'point_io_last_step_round_trips': 2
+    }
@@ -0,0 +1,116 @@
+import logging
+from time import monotonic, sleep
+from types import SimpleNamespace
+
+from alfalfa_worker.lib.redis_log_handler import RedisLogHandler
+
+
+class MockPipeline:
+    def __init__(self, redis: "MockListRedis") -> None:
+        self.redis = redis
+        self.commands = []
+
+    def rpush(self, key, *values):
+        self.commands.append(('rpush', key, values))
+
+    def ltrim(self, key, start, end):
+        self.commands.append(('ltrim', key, start, end))
+
+    def execute(self):
+        self.redis.executions += 1
+        for command in self.commands:
+            if command[0] == 'rpush':
+                self.redis.lists.setdefault(command[1], []).extend(command[2])
+            else:
+                _, key, start, end = command
+                entries = self.redis.lists.get(key, [])
+                self.redis.lists[key] = entries[start:len(entries) + end + 1]
+
+
+class MockListRedis:
+    def __init__(self) -> None:
+        self.lists = {}
+        self.executions = 0
+
+    def pipeline(self, transaction=True):
+        return MockPipeline(self)
+
+
+def create_logger(handler: RedisLogHandler) -> logging.Logger:
+    logger = logging.getLogger(f"test_redis_log_handler_{id(handler)}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    return logger
+
+
+def test_redis_log_handler_batches_records():
+    redis = MockListRedis()
+    handler = RedisLogHandler(SimpleNamespace(ref_id="run_1"), logging.INFO, redis=redis, flush_interval=60)
+    logger = create_logger(handler)
+
+    for i in range(10):
+        logger.info(f"message {i}")
+    logger.debug("not logged")
+    assert handler.flush()
+
+    assert redis.lists["run:run_1:log"] == [f"message {i}" for i in range(10)]
+    # Flushing writes everything that was queued in one pipeline
+    assert redis.executions == 1
+    assert handler.stats() == {'log_dropped': 0, 'log_written': 10, 'log_failed': 0}
+    handler.close()
+
+
+def test_redis_log_handler_caps_list_length():
+    redis = MockListRedis()
+    handler = RedisLogHandler(SimpleNamespace(ref_id="run_1"), redis=redis, max_length=5, batch_size=3)
+    logger = create_logger(handler)
+
+    for i in range(20):
+        logger.info(f"message {i}")
+    handler.close()
+
+    assert redis.lists["run:run_1:log"] == [f"message {i}" for i in range(15, 20)]
+
+
+def test_redis_log_handler_drops_oldest():
+    redis = MockListRedis()
+    handler = RedisLogHandler(SimpleNamespace(ref_id="run_1"), redis=redis, max_queue_size=5, flush_interval=60)
+    logger = create_logger(handler)
+
+    # Hold the queue so the background thread cannot write while records are logged
+    handler._start()
+    with handler._condition:
+        for i in range(8):
+            logger.info(f"message {i}")
+    handler.close()
+
+    assert redis.lists["run:run_1:log"] == [f"message {i}" for i in range(3, 8)]
+    assert handler.stats()['log_dropped'] == 3
+
+
+def test_redis_log_handler_counts_failures():
+    redis = MockListRedis()
+    redis.pipeline = None
+    handler = RedisLogHandler(SimpleNamespace(ref_id="run_1"), redis=redis)
+    logger = create_logger(handler)
+
+    logger.info("message")
+    handler.close()
+    assert handler.stats() == {'log_dropped': 0, 'log_written': 0, 'log_failed': 1}
+
+
+def test_redis_log_handler_explicit_zero_flush_interval(monkeypatch):
+    monkeypatch.setenv('RUN_LOG_FLUSH_INTERVAL', '60')
+    redis = MockListRedis()
+    handler = RedisLogHandler(SimpleNamespace(ref_id="run_1"), redis=redis, flush_interval=0)
+    assert handler.flush_interval == 0
+    logger = create_logger(handler)
+
+    # Records are pushed as soon as they are logged instead of waiting for the interval from the environment
+    logger.info("message")
+    deadline = monotonic() + 5
+    while redis.executions == 0 and monotonic() < deadline:
+        sleep(0.01)
+    assert redis.lists["run:run_1:log"] == ["message"]
+    handler.close()
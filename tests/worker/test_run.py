@@ -1,8 +1,9 @@
 from uuid import uuid4
 
 from alfalfa_worker.dispatcher import Dispatcher
-from alfalfa_worker.lib.enums import RunStatus
+from alfalfa_worker.lib.enums import PointType, RunStatus
 from alfalfa_worker.lib.job import JobStatus
+from alfalfa_worker.lib.models import Point
 from tests.worker.jobs.empty_job_1 import EmptyJob1
 from tests.worker.jobs.empty_job_2 import EmptyJob2
 from tests.worker.jobs.error_mock_job import ErrorMockJob
@@ -105,3 +106,31 @@ def test_job_history(dispatcher: Dispatcher):
     run_2.reload()
     assert run_1.job_history == [EmptyJob1.job_path(), EmptyJob2.job_path()]
     assert run_2.job_history == [EmptyJob2.job_path(), EmptyJob1.job_path()]
+
+
+def test_run_point_registry(dispatcher: Dispatcher):
+    run = dispatcher.run_manager.create_empty_run()
+    run.add_point(Point(ref_id="input", name="Input", point_type=PointType.INPUT))
+    run.add_point(Point(ref_id="both", name="Both", point_type=PointType.BIDIRECTIONAL))
+
+    input_points = run.input_points
+    assert [point.ref_id for point in input_points] == ["input", "both"]
+    assert [point.ref_id for point in run.output_points] == ["both"]
+    # The registry is reused until points are added
+    assert run.input_points is input_points
+
+    run.add_point(Point(ref_id="output", name="Output", point_type=PointType.OUTPUT))
+    assert run.input_points is not input_points
+    assert [point.ref_id for point in run.output_points] == ["both", "output"]
+
+
+def test_run_add_points(dispatcher: Dispatcher):
+    run = dispatcher.run_manager.create_empty_run()
+    run.add_point(Point(ref_id="input", name="Input", point_type=PointType.INPUT))
+    input_points = run.input_points
+
+    run.add_points([Point(ref_id="both", name="Both", point_type=PointType.BIDIRECTIONAL),
+                    Point(ref_id="output", name="Output", point_type=PointType.OUTPUT)])
+    assert run.input_points is not input_points
+    assert [point.ref_id for point in run.input_points] == ["input", "both"]
+    assert [point.ref_id for point in run.output_points] == ["both", "output"]
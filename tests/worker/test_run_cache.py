@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from alfalfa_worker.lib.run_cache import RunCache
+
+
+def make_run_dir(path: Path, size: int) -> Path:
+    path.mkdir()
+    (path / 'model.idf').write_bytes(b'0' * size)
+    return path
+
+
+def test_run_cache_take(tmp_path: Path):
+    cache = RunCache(tmp_path / 'cache', 1024)
+    cache.put('run', make_run_dir(tmp_path / 'run', 10), 'etag')
+    assert not (tmp_path / 'run').exists()
+
+    assert cache.take('run', 'etag', tmp_path / 'run')
+    assert (tmp_path / 'run' / 'model.idf').exists()
+    assert not cache.take('run', 'etag', tmp_path / 'other')
+
+
+def test_run_cache_etag_mismatch(tmp_path: Path):
+    cache = RunCache(tmp_path / 'cache', 1024)
+    cache.put('run', make_run_dir(tmp_path / 'run', 10), 'old')
+
+    assert not cache.take('run', 'new', tmp_path / 'run')
+    assert not (tmp_path / 'cache' / 'run').exists()
+
+
+def test_run_cache_eviction(tmp_path: Path):
+    cache = RunCache(tmp_path / 'cache', 25)
+    cache.put('first', make_run_dir(tmp_path / 'first', 10), 'etag')
+    cache.put('second', make_run_dir(tmp_path / 'second', 10), 'etag')
+    cache.put('third', make_run_dir(tmp_path / 'third', 10), 'etag')
+
+    assert not cache.take('first', 'etag', tmp_path / 'first')
+    assert cache.take('second', 'etag', tmp_path / 'second')
+    assert cache.take('third', 'etag', tmp_path / 'third')
@@ -0,0 +1,190 @@
+import io
+import logging
+import tarfile
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from alfalfa_worker.lib.archive import ArchiveFormat
+from alfalfa_worker.lib.run_manager import (
+    UPLOAD_FAILED,
+    UPLOAD_PENDING,
+    RunManager
+)
+
+
+class MockBucket:
+    def __init__(self):
+        self.objects = {}
+
+    def upload_fileobj(self, fileobj, key, Config=None):
+        data = b''
+        while chunk := fileobj.read(1024):
+            data += chunk
+        self.objects[key] = data
+
+
+class SlowBucket(MockBucket):
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def upload_fileobj(self, fileobj, key, Config=None):
+        time.sleep(self.delay)
+        super().upload_fileobj(fileobj, key, Config)
+
+
+class FailingBucket:
+    def upload_fileobj(self, fileobj, key, Config=None):
+        raise ConnectionError("Could not connect to s3")
+
+
+class MockRedis:
+    def __init__(self):
+        self.values = {}
+        self.expirations = {}
+        self.lock = threading.Lock()
+
+    def set(self, key, value, ex=None):
+        with self.lock:
+            self.values[key] = value.encode('UTF-8')
+            self.expirations[key] = None if ex is None else time.monotonic() + ex
+
+    def expire(self, key, ex):
+        with self.lock:
+            if key in self.values:
+                self.expirations[key] = time.monotonic() + ex
+
+    def ttl(self, key):
+        expiration = self.expirations.get(key)
+        return None if expiration is None else expiration - time.monotonic()
+
+    def get(self, key):
+        with self.lock:
+            expiration = self.expirations.get(key)
+            if expiration is not None and time.monotonic() > expiration:
+                self.values.pop(key, None)
+            return self.values.get(key)
+
+    def delete(self, key):
+        with self.lock:
+            self.values.pop(key, None)
+
+
+@pytest.fixture
+def run_manager(tmp_path):
+    run_manager = RunManager.__new__(RunManager)
+    run_manager.logger = logging.getLogger('RunManager')
+    run_manager.s3_bucket = MockBucket()
+    run_manager.transfer_config = None
+    run_manager.redis = MockRedis()
+    run_manager.run_dir = tmp_path
+    run_manager.tmp_dir = tmp_path / 'tmp'
+    run_manager.tmp_dir.mkdir()
+    run_manager.run_cache = None
+    run_manager.checkin_async = True
+    run_manager.checkin_timeout = 5
+    run_manager.upload_heartbeat = 30
+    run_manager.upload_failed_ttl = 3600
+    run_manager.uploads = {}
+    run_manager.archive_format = ArchiveFormat.GZ
+    return run_manager
+
+
+def make_run(run_manager, run_id='run_id'):
+    run_path = run_manager.run_dir / run_id
+    run_path.mkdir()
+    (run_path / 'model.idf').write_text('Version,22.1;')
+    return SimpleNamespace(ref_id=run_id, dir=run_path, archive_key=None, save=lambda: None)
+
+
+def test_s3_upload_stream(tmp_path):
+    (tmp_path / 'model.idf').write_text('Version,22.1;')
+    run_manager = SimpleNamespace(s3_bucket=MockBucket(), transfer_config=None)
+
+    def write_archive(file):
+        with tarfile.open(fileobj=file, mode='w|gz') as tar:
+            tar.add(tmp_path, arcname='run')
+
+    RunManager.s3_upload_stream(run_manager, write_archive, 'run/run.tar.gz')
+
+    with tarfile.open(fileobj=io.BytesIO(run_manager.s3_bucket.objects['run/run.tar.gz']), mode='r|*') as tar:
+        assert 'run/model.idf' in [member.name for member in tar]
+
+
+def test_s3_upload_stream_error(tmp_path):
+    run_manager = SimpleNamespace(s3_bucket=MockBucket(), transfer_config=None)
+
+    def write_archive(file):
+        file.write(b'partial')
+        raise ValueError("Failed to write archive")
+
+    with pytest.raises(ValueError):
+        RunManager.s3_upload_stream(run_manager, write_archive, 'run/run.tar.gz')
+    assert 'run/run.tar.gz' not in run_manager.s3_bucket.objects
+
+
+def test_async_upload_failure_restores_run(run_manager, tmp_path):
+    run_manager.s3_bucket = FailingBucket()
+    run = make_run(run_manager)
+
+    run_manager.checkin_run(run)
+    run_manager.wait_for_uploads()
+    assert run_manager._get_upload_state('run_id') == UPLOAD_FAILED
+    # The failed state expires eventually so it can't block other workers forever
+    assert run_manager.redis.ttl(run_manager._upload_key('run_id')) == pytest.approx(3600, abs=5)
+    assert (run_manager.tmp_dir / 'run_id').exists()
+
+    assert run_manager._wait_for_upload('run_id')
+    assert (tmp_path / 'run_id' / 'model.idf').read_text() == 'Version,22.1;'
+    assert not (run_manager.tmp_dir / 'run_id').exists()
+    assert run_manager._get_upload_state('run_id') is None
+
+
+def test_async_upload_failed_on_another_worker(run_manager):
+    run_manager._set_upload_state('run_id', UPLOAD_FAILED, ex=run_manager.upload_failed_ttl)
+    with pytest.raises(RuntimeError, match='another worker'):
+        run_manager._wait_for_upload('run_id')
+
+    # A later checkin of the run replaces the failed upload
+    run_manager.checkin_async = False
+    run_manager.checkin_run(make_run(run_manager))
+    assert run_manager._get_upload_state('run_id') is None
+    assert not run_manager._wait_for_upload('run_id')
+    assert 'run/run_id.tar.gz' in run_manager.s3_bucket.objects
+
+
+def test_async_upload_heartbeat(run_manager):
+    # The upload takes longer than the pending state lives without being refreshed
+    run_manager.s3_bucket = SlowBucket(1)
+    run_manager.upload_heartbeat = 0.3
+    run = make_run(run_manager)
+
+    run_manager.checkin_run(run)
+    time.sleep(0.6)
+    assert run_manager._get_upload_state('run_id') == UPLOAD_PENDING
+
+    assert not run_manager._wait_for_upload('run_id')
+    assert 'run/run_id.tar.gz' in run_manager.s3_bucket.objects
+    assert run_manager._get_upload_state('run_id') is None
+    assert run_manager.uploads == {}
+
+
+def test_async_upload_expires_without_heartbeat(run_manager):
+    # A worker which died while uploading stops refreshing the pending state
+    run_manager._set_upload_state('run_id', UPLOAD_PENDING, ex=0.2)
+    start = time.monotonic()
+    assert not run_manager._wait_for_upload('run_id')
+    assert time.monotonic() - start < 2
+
+
+def test_finished_uploads_are_forgotten(run_manager):
+    run_manager.s3_bucket = SlowBucket(0.2)
+    run = make_run(run_manager)
+
+    run_manager.checkin_run(run)
+    upload = run_manager.uploads['run_id']
+    upload.join()
+    assert run_manager.uploads == {}
@@ -0,0 +1,118 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+pytest.importorskip('pyfmi')
+pytest.importorskip('matplotlib')
+
+from pyfmi.fmi import FMUModelCS2  # noqa: E402
+
+from alfalfa_worker.lib import testcase  # noqa: E402
+from alfalfa_worker.lib.kpi_accumulator import KPIAccumulator  # noqa: E402
+from alfalfa_worker.lib.trajectory_store import TrajectoryStore  # noqa: E402
+
+OUTPUTS = ['zon_reaTRooAir_y', 'fcu_reaPFan_y']
+INPUTS = ['con_oveTSetHea_u', 'con_oveTSetHea_activate']
+
+
+def make_test_case(fmu, stepping):
+    """Create a TestCase around a mocked FMU without loading an FMU or its data"""
+    case = testcase.TestCase.__new__(testcase.TestCase)
+    case.fmu = fmu
+    case.stepping = stepping
+    case.kpi_json = {'ElectricPower': ['fcu_reaPFan_y']}
+    case.heat_setpoint = 273.15 + 20
+    case.kpi_accumulator = KPIAccumulator(['fcu_reaPFan_y'])
+    case.inputs_metadata = {'con_oveTSetHea_u': {'Minimum': 288.15, 'Maximum': 296.15}}
+    case.y = {'time': [], **{key: [] for key in OUTPUTS}}
+    case.y_store = TrajectoryStore(case.y.keys())
+    case.u = {'time': [], **{key: [] for key in INPUTS}}
+    case.u_store = TrajectoryStore(case.u.keys())
+    case.options = {}
+    case.step = 60.0
+    case.start_time = 0
+    case.initialize = True
+    return case
+
+
+def test_advance_do_step():
+    fmu = MagicMock(spec=FMUModelCS2)
+    fmu.do_step.return_value = 0
+    values = {'zon_reaTRooAir_y': 294.0, 'fcu_reaPFan_y': 100.0, 'con_oveTSetHea_u': 296.15, 'con_oveTSetHea_activate': 1}
+    fmu.get.side_effect = lambda keys: [values[key] for key in keys]
+    case = make_test_case(fmu, stepping=True)
+
+    y = case.advance({'con_oveTSetHea_u': 300, 'con_oveTSetHea_activate': 1})
+    case.advance({})
+
+    # The FMU is initialized once and then only stepped
+    fmu.setup_experiment.assert_called_once_with(start_time=0)
+    fmu.enter_initialization_mode.assert_called_once()
+    fmu.exit_initialization_mode.assert_called_once()
+    # Inputs are clamped to their maximum and only set when written
+    fmu.set.assert_called_once_with(['con_oveTSetHea_u', 'con_oveTSetHea_activate'], [296.15, 1.0])
+    assert [call.kwargs for call in fmu.do_step.call_args_list] == [
+        {'current_t': 0, 'step_size': 60.0, 'new_step': True},
+        {'current_t': 60.0, 'step_size': 60.0, 'new_step': True}
+    ]
+    fmu.simulate.assert_not_called()
+
+    assert y['zon_reaTRooAir_y'] == 294.0
+    assert case.start_time == 120.0
+    assert case.y_store['time'].tolist() == [60.0, 120.0]
+    assert case.u_store['con_oveTSetHea_u'].tolist() == [296.15, 296.15]
+    assert case.kpi_accumulator.integral('fcu_reaPFan_y') == pytest.approx(100.0 * 60)
+
+
+def test_advance_do_step_failure():
+    fmu = MagicMock(spec=FMUModelCS2)
+    fmu.do_step.return_value = 2
+    case = make_test_case(fmu, stepping=True)
+
+    with pytest.raises(RuntimeError, match='failed with status 2'):
+        case.advance({})
+
+
+def test_advance_simulate():
+    fmu = MagicMock()
+
+    def simulate(start_time, final_time, options, input):
+        time = np.array([start_time, final_time])
+        res = {'time': time, 'con_oveTSetHea_u': np.array([293.15, 293.15]), 'con_oveTSetHea_activate': np.zeros(2)}
+        res.update({key: np.array([290.0, 291.0]) for key in OUTPUTS})
+        return res
+
+    fmu.simulate.side_effect = simulate
+    case = make_test_case(fmu, stepping=False)
+
+    y = case.advance({'con_oveTSetHea_u': 293.15})
+    first_call = fmu.simulate.call_args_list[0].kwargs
+    case.advance({})
+
+    u_list, u_trajectory = first_call['input']
+    assert u_list == ['con_oveTSetHea_u']
+    assert u_trajectory.tolist() == [[0, 293.15]]
+    assert fmu.simulate.call_args_list[1].kwargs['input'] is None
+    # Only the first simulation initializes the FMU
+    assert case.options['initialize'] is False
+    fmu.do_step.assert_not_called()
+
+    assert y['zon_reaTRooAir_y'] == 291.0
+    assert case.y_store['time'].tolist() == [60.0, 120.0]
+
+
+@pytest.mark.parametrize('do_step', [None, False, True])
+def test_do_step_option(monkeypatch, do_step):
+    monkeypatch.delenv('BOPTEST_DO_STEP', raising=False)
+    fmu = MagicMock(spec=FMUModelCS2)
+    fmu.get_version.return_value = '2.0'
+    fmu.get_model_variables.return_value = {}
+    monkeypatch.setattr(testcase, 'load_fmu', lambda path, log_level: fmu)
+    monkeypatch.setattr(testcase, 'Data_Manager', MagicMock())
+    monkeypatch.setattr(testcase.TestCase, 'kpi_json', {}, raising=False)
+
+    kwargs = {} if do_step is None else {'do_step': do_step}
+    case = testcase.TestCase(fmupath='model.fmu', step=60, **kwargs)
+    # Co-simulation FMUs are only stepped with do_step when it is enabled
+    assert case.stepping is bool(do_step)
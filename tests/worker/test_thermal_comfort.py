@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from alfalfa_worker.lib.thermal_comfort import ThermalComfort
+
+
+def test_pmv_ppd():
+    # ISO 7730 Table D.1 example
+    pmv, ppd = ThermalComfort.pmv_ppd(ta=22, tr=22, met=1.2, clo=0.5, vel=0.1, rh=60)
+    assert pmv == pytest.approx(-0.75, abs=0.01)
+    assert ppd == pytest.approx(17, abs=0.5)
+
+
+def test_pmv_ppd_array():
+    rng = np.random.default_rng(0)
+    shape = (10, 50)
+    ta = rng.uniform(15, 30, shape)
+    tr = rng.uniform(15, 30, shape)
+    met = rng.uniform(0.8, 2, shape)
+    rh = rng.uniform(20, 80, shape)
+
+    pmv, ppd = ThermalComfort.pmv_ppd_array(ta, tr, met, clo=0.5, vel=0.1, rh=rh)
+
+    assert pmv.shape == shape
+    for index in np.ndindex(shape):
+        expected = ThermalComfort.pmv_ppd(ta[index], tr[index], met[index], 0.5, 0.1, rh[index])
+        assert pmv[index] == expected[0]
+        assert ppd[index] == expected[1]
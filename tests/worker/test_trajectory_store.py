@@ -0,0 +1,22 @@
+import numpy as np
+
+from alfalfa_worker.lib.trajectory_store import TrajectoryStore
+
+
+def test_trajectory_store_append():
+    store = TrajectoryStore(['time', 'power'], capacity=2)
+    store.append({'time': [60.0], 'power': [1.0]})
+    store.append({'time': np.array([120.0, 180.0]), 'power': np.array([2.0, 3.0])})
+
+    assert len(store) == 3
+    assert store['time'].tolist() == [60.0, 120.0, 180.0]
+    assert store['power'].tolist() == [1.0, 2.0, 3.0]
+    assert store.to_dict()['power'].dtype == np.float64
+    assert 'power' in store
+    assert 'energy' not in store
+
+
+def test_trajectory_store_empty():
+    store = TrajectoryStore(['time'])
+    assert len(store) == 0
+    assert store['time'].tolist() == []